@@ -0,0 +1,132 @@
+"""
+Guide and team ID allocation for new teams.
+
+Each guide has a GuideLoad row holding the number of teams allocated to
+them. allocate_guide() locks the least-loaded guide's row that is still
+under capacity (select_for_update) and increments its counter in the same
+transaction, so concurrent registrations are spread across guides instead
+of all reading the same minimum. The counter is also bumped with a
+compare-and-set on team_count, which keeps SQLite (where
+select_for_update is a no-op) correct as well.
+
+next_team_id() numbers teams from a TeamIdSequence counter row per
+academic-year prefix, so IDs never collide and need no existence check.
+
+Call both inside the registration's transaction: if the team is not
+created, the increments roll back with it. Deleting a team (also through
+its user) or saving it with another guide moves the count back via the
+Team signal receivers in models.py.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .models import GuideLoad, Team, TeamIdSequence, User
+
+# Compare-and-set attempts before giving up under heavy contention
+MAX_ATTEMPTS = 10
+
+
+class AllocationError(Exception):
+    """A new team cannot be given a guide or an ID (shown to the registrant)."""
+
+
+class NoGuideAvailable(AllocationError):
+    """No guide is registered, or every guide is at capacity."""
+
+
+class TeamIdsExhausted(AllocationError):
+    """Every number of this year's team ID prefix has been used."""
+
+
+def _under_capacity():
+    default = settings.EVALX_GUIDE_CAPACITY
+    own = Q(capacity__isnull=False, team_count__lt=F('capacity'))
+    if default is None:
+        return own | Q(capacity__isnull=True)
+    return own | Q(capacity__isnull=True, team_count__lt=default)
+
+
+def ensure_guide_loads():
+    """Creates the missing GuideLoad rows (new guides), counting their current teams."""
+    missing = User.objects.filter(role='GUIDE', guide_load__isnull=True).annotate(n=Count('team_profile'))
+    GuideLoad.objects.bulk_create(
+        [GuideLoad(guide_id=guide.pk, team_count=guide.n) for guide in missing],
+        ignore_conflicts=True,
+    )
+
+
+def rebuild_guide_loads():
+    """Recounts every guide's teams (after guides were changed with queryset update() or raw SQL)."""
+    ensure_guide_loads()
+    counts = dict(Team.objects.filter(guide__isnull=False).values('guide').annotate(n=Count('pk')).values_list('guide', 'n'))
+    loads = list(GuideLoad.objects.all())
+    for load in loads:
+        load.team_count = counts.get(load.guide_id, 0)
+    GuideLoad.objects.bulk_update(loads, ['team_count'])
+    return len(loads)
+
+
+def allocate_guide():
+    """
+    Reserves a slot with the least-loaded guide under capacity (ties go to
+    the lowest id) and returns the guide. Raises NoGuideAvailable.
+    """
+    with transaction.atomic():
+        ensure_guide_loads()
+        for _ in range(MAX_ATTEMPTS):
+            load = (
+                GuideLoad.objects.select_related('guide').select_for_update(of=('self',))
+                .filter(_under_capacity(), guide__role='GUIDE')
+                .order_by('team_count', 'guide_id')
+                .first()
+            )
+            if load is None:
+                raise NoGuideAvailable("No Faculty Guides are currently available.")
+            claimed = GuideLoad.objects.filter(pk=load.pk, team_count=load.team_count).update(
+                team_count=F('team_count') + 1)
+            if claimed:
+                return load.guide
+    raise NoGuideAvailable("Guide allocation is busy, please try again.")
+
+
+def team_id_prefix(when=None):
+    """The team ID prefix of the academic year containing when (default: now)."""
+    when = timezone.localdate(when)
+    year = when.year if when.month >= settings.EVALX_ACADEMIC_YEAR_START_MONTH else when.year - 1
+    return settings.EVALX_TEAM_ID_PREFIX.format(year=year % 100)
+
+
+def _highest_number(prefix, digits):
+    """Highest number already used under prefix (seeds a new counter row)."""
+    last = (
+        Team.objects.annotate(id_length=Length('team_id'))
+        .filter(team_id__startswith=prefix, id_length=len(prefix) + digits)
+        .order_by('-team_id').values_list('team_id', flat=True).first()
+    )
+    return int(last[len(prefix):]) if last and last[len(prefix):].isdigit() else 0
+
+
+def next_team_id(when=None):
+    """
+    The next team ID of the academic year. The counter row stays locked by
+    the increment until the surrounding transaction ends, so the value read
+    back is ours.
+    """
+    prefix = team_id_prefix(when)
+    digits = settings.EVALX_TEAM_ID_DIGITS
+    with transaction.atomic():
+        if not TeamIdSequence.objects.filter(pk=prefix).update(last_value=F('last_value') + 1):
+            # First team of the year
+            try:
+                with transaction.atomic():
+                    TeamIdSequence.objects.create(prefix=prefix, last_value=_highest_number(prefix, digits) + 1)
+            except IntegrityError:
+                # Another registration created the row first
+                TeamIdSequence.objects.filter(pk=prefix).update(last_value=F('last_value') + 1)
+        number = TeamIdSequence.objects.filter(pk=prefix).values_list('last_value', flat=True).get()
+    if number >= 10 ** digits:
+        raise TeamIdsExhausted(f"All {prefix} team IDs are in use.")
+    return f'{prefix}{number:0{digits}d}'
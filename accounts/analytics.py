@@ -0,0 +1,173 @@
+"""
+Moderation analytics over the whole cohort.
+
+Built on the Cohort columns (one values_list() query, NumPy arrays), so a
+full department is summarised in a few milliseconds:
+
+* distributions (mean, stddev, percentiles, histogram) of every evaluator
+  role's review totals, of each guide's totals, and of the final mark;
+* inter-evaluator disagreement per review: for each pair of evaluators the
+  mean signed and absolute difference and their correlation;
+* outlier flags: guides who mark consistently above or below the rest of
+  the panel, and students whose evaluators disagree by a wide margin.
+
+An evaluator's total only counts once it has been entered: absent students
+and all-zero totals (sheet not filled in yet) are left out.
+"""
+from itertools import combinations
+
+from .cohort import Cohort, np
+from .models import TeamMember
+from .rubric import EVALUATOR_LABELS, get_rubric
+
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 10
+
+# A guide is flagged when their mean difference from the other evaluators
+# of the same students exceeds this fraction of the review maximum
+BIAS_LIMIT = 0.1
+# A student is flagged when the spread of their evaluators' totals exceeds
+# this fraction of the review maximum
+SPREAD_LIMIT = 0.25
+# Guides with fewer entered totals than this are listed but never flagged
+MIN_GROUP = 3
+MAX_FLAGGED_STUDENTS = 100
+
+GUIDE_FIELD = 'team__guide__email'
+
+
+def describe(values, maximum):
+    """Summary statistics and a histogram over 0..maximum of a 1-D array."""
+    if not len(values):
+        return {'n': 0, 'mean': None, 'std': None, 'min': None, 'max': None,
+                'percentiles': {}, 'histogram': {'edges': [], 'counts': []}}
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS, range=(0.0, maximum))
+    return {
+        'n': int(len(values)),
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'percentiles': {f'p{p}': float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+        'histogram': {'edges': edges.tolist(), 'counts': counts.tolist()},
+    }
+
+
+def _entered(cohort, review, prefix):
+    """(totals, mask of members whose total for this evaluator has been entered)."""
+    totals = cohort.scores[f'{review}_{EVALUATOR_LABELS[prefix]}_total']
+    absent = cohort.marks[f'{review}_{prefix}_absent'] != 0
+    return totals, ~absent & (totals > 0)
+
+
+def _review_analytics(cohort, review, spec, maximum, guides):
+    prefixes = list(spec['evaluators'])
+    entered = {p: _entered(cohort, review, p) for p in prefixes}
+
+    roles = {
+        EVALUATOR_LABELS[p]: describe(totals[mask], maximum)
+        for p, (totals, mask) in entered.items()
+    }
+
+    pairs = []
+    for a, b in combinations(prefixes, 2):
+        (ta, ma), (tb, mb) = entered[a], entered[b]
+        both = ma & mb
+        diff = ta[both] - tb[both]
+        corr = None
+        if both.sum() > 1 and ta[both].std() > 0 and tb[both].std() > 0:
+            corr = float(np.corrcoef(ta[both], tb[both])[0, 1])
+        pairs.append({
+            'pair': f'{EVALUATOR_LABELS[a]}-{EVALUATOR_LABELS[b]}',
+            'n': int(both.sum()),
+            'mean_diff': float(diff.mean()) if len(diff) else None,
+            'mean_abs_diff': float(np.abs(diff).mean()) if len(diff) else None,
+            'corr': corr,
+        })
+
+    # Per-student spread across the evaluators who entered a total
+    stack = np.vstack([entered[p][0] for p in prefixes])
+    masks = np.vstack([entered[p][1] for p in prefixes])
+    n_entered = masks.sum(axis=0)
+    high = np.where(masks, stack, -np.inf).max(axis=0)
+    low = np.where(masks, stack, np.inf).min(axis=0)
+    compared = n_entered >= 2
+    spread = np.where(compared, high - low, 0.0)
+    flagged = np.flatnonzero(compared & (spread > SPREAD_LIMIT * maximum))
+    students = [{
+        'review': review,
+        'reg_number': cohort.text['reg_number'][i],
+        'name': cohort.text['name'][i],
+        'spread': float(spread[i]),
+        'totals': {EVALUATOR_LABELS[p]: float(entered[p][0][i]) for p in prefixes if entered[p][1][i]},
+    } for i in flagged]
+
+    guide_rows = []
+    if 'g' in entered:
+        totals, mask = entered['g']
+        # The guide's total against the mean of the other entered evaluators
+        others = [p for p in prefixes if p != 'g']
+        if others:
+            other_sum = sum(np.where(entered[p][1], entered[p][0], 0.0) for p in others)
+            other_n = sum(entered[p][1].astype(np.float64) for p in others)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                panel = other_sum / other_n
+            paired = mask & (other_n > 0)
+        else:
+            paired = np.zeros(len(cohort), dtype=bool)
+        for guide in sorted(set(guides[mask])):
+            mine = guides == guide
+            row = {'guide': guide, **describe(totals[mine & mask], maximum)}
+            both = mine & paired
+            row['paired'] = int(both.sum())
+            row['bias'] = float((totals[both] - panel[both]).mean()) if both.any() else None
+            guide_rows.append(row)
+
+        biases = np.array([r['bias'] for r in guide_rows if r['bias'] is not None and r['paired'] >= MIN_GROUP])
+        centre, scale = (biases.mean(), biases.std()) if len(biases) else (0.0, 0.0)
+        for row in guide_rows:
+            ok = row['bias'] is not None and row['paired'] >= MIN_GROUP
+            row['z'] = float((row['bias'] - centre) / scale) if ok and scale > 0 else None
+            row['flagged'] = bool(ok and abs(row['bias']) > BIAS_LIMIT * maximum)
+
+    return {
+        'maximum': maximum,
+        'roles': roles,
+        'disagreement': pairs,
+        'guides': guide_rows,
+        'flagged_students': students,
+    }
+
+
+def cohort_analytics(queryset=None):
+    """
+    The moderation analytics of queryset (default: every member) as a
+    JSON-ready dict.
+    """
+    if queryset is None:
+        queryset = TeamMember.objects.order_by('reg_number')
+    rubric = get_rubric()
+    cohort = Cohort.from_queryset(queryset, extra=(GUIDE_FIELD,))
+    guides = np.array([g or 'Unassigned' for g in cohort.text[GUIDE_FIELD]], dtype=object)
+
+    reviews = {
+        review: _review_analytics(cohort, review, spec, rubric.maxima[f'{review}_consolidated_40'], guides)
+        for review, spec in rubric.config['reviews'].items()
+    }
+    flagged_students = sorted(
+        (s for r in reviews.values() for s in r.pop('flagged_students')),
+        key=lambda s: -s['spread'],
+    )
+    final = cohort.scores['final_internal_75']
+    return {
+        'members': len(cohort),
+        'reviews': reviews,
+        'final': describe(final[final > 0], rubric.maxima['final_internal_75']),
+        'flagged_guides': [
+            {'review': review, **row}
+            for review, data in reviews.items() for row in data['guides'] if row['flagged']
+        ],
+        'flagged_students': flagged_students[:MAX_FLAGGED_STUDENTS],
+        'flagged_students_total': len(flagged_students),
+        'limits': {'bias': BIAS_LIMIT, 'spread': SPREAD_LIMIT, 'min_group': MIN_GROUP},
+    }
@@ -2,4 +2,10 @@ from django.apps import AppConfig
 
 
 class AccountsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        # A mistake in EVALX_RUBRIC fails at startup, not on the first request
+        from .rubric import get_rubric
+        get_rubric()
@@ -0,0 +1,157 @@
+"""
+Shared save engine for the coordinator batch evaluation sheets.
+
+Each sheet posts one input per student per mark, named '<prefix>_<member id>'.
+The sheets only post the inputs the evaluator changed (see
+batch_sheet_diff.html), so a missing input means "leave as is". The POST is
+parsed once, compared against the current DB values of just the posted rows
+(locked until the save commits, since bulk_update() rewrites the persisted
+totals from them), and only real deltas are written back with a single
+bulk_update() inside one transaction.
+"""
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import TeamMember
+from .rubric import get_rubric
+
+
+class BatchSheet:
+    def __init__(self, title, template, projection, marks, flags=None):
+        self.title = title
+        self.template = template
+        self.projection = projection  # PROJECTIONS entry the sheet renders from
+        self.marks = marks          # POST prefix -> FloatField on TeamMember
+        self.flags = flags or {}    # POST prefix -> BooleanField (checkbox)
+
+    @property
+    def fields(self):
+        return list(self.marks.values()) + list(self.flags.values())
+
+
+BATCH_SHEETS = {
+    'r1': BatchSheet(
+        "Review 1 (Coordinator)", 'accounts/batch_sheet_r1_coordinator.html', 'review1',
+        marks={'comp': 'r1_c_comp', 'func': 'r1_c_func', 'pres': 'r1_c_pres', 'oral': 'r1_c_oral', 'know': 'r1_c_know'},
+        flags={'absent': 'r1_c_absent'},
+    ),
+    'r2': BatchSheet(
+        "Review 2 (Coordinator)", 'accounts/batch_sheet_r2_coordinator.html', 'review2',
+        marks={'comp': 'r2_c_comp', 'func': 'r2_c_func', 'pres': 'r2_c_pres', 'oral': 'r2_c_oral', 'know': 'r2_c_know'},
+        flags={'absent': 'r2_c_absent'},
+    ),
+    's2': BatchSheet(
+        "Institutional Sheet 2", 'accounts/batch_sheet_s2_coordinator.html', 'sheet2',
+        marks={'teamwork': 's2_teamwork', 'tech': 's2_tech_know', 'reg': 's2_regularity'},
+    ),
+    'report': BatchSheet(
+        "Report Evaluation", 'accounts/batch_sheet_report_coordinator.html', 'report',
+        marks={'report': 'report_coord'},
+    ),
+    'attendance': BatchSheet(
+        "Attendance Record", 'accounts/batch_sheet_attendance_coordinator.html', 'attendance',
+        marks={'attendance': 'attendance_marks'},
+    ),
+}
+
+
+TRUE_VALUES = ('1', 'on', 'true')
+
+
+def parse_batch_post(post, sheet):
+    """
+    Groups the posted inputs by member id: {member_id: {field: value}}.
+    Only inputs present in the POST appear. Checkboxes are preceded by a
+    hidden '0' input of the same name, so the last value wins.
+    Raises ValueError for a mark that is not a number or is outside
+    0..its rubric maximum.
+    """
+    maxima = get_rubric().maxima
+    rows = defaultdict(dict)
+    for key, values in post.lists():
+        prefix, _, member_id = key.rpartition('_')
+        if not member_id.isdigit():
+            continue
+        if prefix in sheet.marks:
+            field = sheet.marks[prefix]
+            value = float(values[-1] or 0)
+            if not 0 <= value <= maxima.get(field, float('inf')):
+                raise ValueError(f"{field}={value} is out of range")
+            rows[int(member_id)][field] = value
+        elif prefix in sheet.flags:
+            rows[int(member_id)][sheet.flags[prefix]] = values[-1].lower() in TRUE_VALUES
+    return rows
+
+
+def save_batch_sheet(post, members, sheet):
+    """
+    Applies a posted batch sheet to the given members queryset and returns
+    how many students changed. Only the posted rows are loaded, and only the
+    fields whose value differs from the database are written.
+    """
+    posted = parse_batch_post(post, sheet)
+    if not posted:
+        return 0
+
+    changed_rows, touched = [], set()
+    with transaction.atomic():
+        # Another sheet saved for the same students at the same time would
+        # otherwise have its totals overwritten from this stale read
+        for m in members.select_for_update(of=('self',)).filter(id__in=posted):
+            row_changed = False
+            for field, value in posted[m.id].items():
+                if getattr(m, field) != value:
+                    setattr(m, field, value)
+                    touched.add(field)
+                    row_changed = True
+            if row_changed:
+                changed_rows.append(m)
+        if changed_rows:
+            TeamMember.objects.bulk_update(changed_rows, sorted(touched))
+    return len(changed_rows)
+
+
+# ==========================================================
+# PAGINATION
+# ==========================================================
+
+BATCH_PAGE_SIZE = 100
+BATCH_MAX_PAGE_SIZE = 500
+
+
+def batch_page(members, params):
+    """
+    Keyset page of a members queryset ordered by reg_number.
+
+    Reads ?after=<reg_number> (the cursor), ?size=, and the optional
+    ?team=<team_id> / ?guide=<guide id> filters from the GET params.
+    Returns (page queryset, filters dict, page size).
+    """
+    filters = {}
+    if params.get('team'):
+        filters['team_id'] = params['team']
+    if params.get('guide'):
+        try:
+            filters['team__guide_id'] = uuid.UUID(params['guide'])
+        except ValueError:
+            pass
+    members = members.filter(**filters)
+
+    if params.get('after'):
+        members = members.filter(reg_number__gt=params['after'])
+
+    try:
+        size = min(int(params.get('size', BATCH_PAGE_SIZE)), BATCH_MAX_PAGE_SIZE)
+    except ValueError:
+        size = BATCH_PAGE_SIZE
+    return members.order_by('reg_number')[:max(size, 1)], filters, max(size, 1)
+
+
+def next_cursor(rows, size):
+    """The ?after= value for the next page, or None on the last page."""
+    if len(rows) < size:
+        return None
+    last = rows[-1]
+    return last['reg_number'] if isinstance(last, dict) else last.reg_number
@@ -0,0 +1,172 @@
+"""
+Content-addressed storage for submission files.
+
+Every distinct file is stored once, as a SubmissionBlob named by its
+SHA-256 under submissions/blobs/<aa>/<bb>/<sha256><ext>. A TeamSubmission
+points at its blob, and identical re-uploads only increment the blob's
+ref_count (the staged upload is dropped, costing no extra bytes).
+Deleting a submission decrements it (models._release_blob); the
+gc_submission_blobs command then removes blobs nothing refers to, and can
+move pre-blob uploads into the store.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef
+from django.utils import timezone
+
+from .models import SubmissionBlob, TeamSubmission
+
+BLOB_DIR = 'submissions/blobs'
+# Uploads being streamed in (see uploads.py)
+STAGING_DIR = 'submissions/.incoming'
+# Files younger than this are never swept (an upload may be committing them)
+GRACE = timedelta(hours=1)
+
+
+def _storage():
+    return SubmissionBlob._meta.get_field('file').storage
+
+
+def blob_name(sha256, extension=''):
+    return f'{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension.lower()}'
+
+
+def _put(name, path):
+    """Moves the file at path to name in the storage (a rename on local disk)."""
+    storage = _storage()
+    try:
+        target = storage.path(name)
+    except NotImplementedError:
+        with open(path, 'rb') as f:
+            storage.save(name, File(f))
+        os.remove(path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+
+def store_blob(path, sha256, size, extension=''):
+    """
+    Takes ownership of the file at path: returns its SubmissionBlob with one
+    more reference, storing the file only if that content is new. Call it
+    in the transaction that creates the referring TeamSubmission.
+    """
+    with transaction.atomic():
+        blob, created = SubmissionBlob.objects.select_for_update().get_or_create(
+            sha256=sha256, defaults={'size': size, 'file': blob_name(sha256, extension)})
+        if created or not _storage().exists(blob.file.name):
+            _put(blob.file.name, path)
+        else:
+            os.remove(path)  # already stored: the duplicate costs nothing
+        SubmissionBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+    return blob
+
+
+def recount():
+    """Resets every ref_count from the submissions actually pointing at the blob."""
+    counts = dict(TeamSubmission.objects.filter(blob__isnull=False).values('blob')
+                  .annotate(n=Count('pk')).values_list('blob', 'n'))
+    blobs = list(SubmissionBlob.objects.only('pk', 'ref_count'))
+    changed = [b for b in blobs if b.ref_count != counts.get(b.pk, 0)]
+    for blob in changed:
+        blob.ref_count = counts.get(blob.pk, 0)
+    SubmissionBlob.objects.bulk_update(changed, ['ref_count'])
+    return len(changed)
+
+
+def _unreferenced():
+    return SubmissionBlob.objects.filter(ref_count=0).exclude(
+        Exists(TeamSubmission.objects.filter(blob=OuterRef('pk'))))
+
+
+def _dead_blobs(cutoff):
+    return list(_unreferenced().select_for_update().filter(created_at__lt=cutoff))
+
+
+def collect_garbage(dry_run=False):
+    """
+    Deletes blobs (rows and files) with no referring submission, plus blob
+    files without a row and abandoned staged uploads. Returns (files
+    removed, bytes freed).
+
+    Each row is deleted only if it is still unreferenced (store_blob may
+    have taken it back since it was selected; select_for_update is a no-op
+    on SQLite), and its file only once that delete has committed.
+    """
+    storage = _storage()
+    cutoff = timezone.now() - GRACE
+    removed, freed = 0, 0
+    with transaction.atomic():
+        for blob in _dead_blobs(cutoff):
+            if not dry_run:
+                if not _unreferenced().filter(pk=blob.pk).delete()[0]:
+                    continue
+                transaction.on_commit(lambda name=blob.file.name: storage.delete(name))
+            removed += 1
+            freed += blob.size
+
+    # Orphaned files: a crash between the file move and the row commit, or
+    # an upload that never finished
+    try:
+        roots = [storage.path(BLOB_DIR), storage.path(STAGING_DIR)]
+    except NotImplementedError:
+        return removed, freed
+    known = set(SubmissionBlob.objects.values_list('file', flat=True))
+    oldest = cutoff.timestamp()
+    for directory, _, files in (entry for root in roots for entry in os.walk(root)):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, storage.path('')).replace(os.sep, '/')
+            stat = os.stat(path)
+            if name not in known and stat.st_mtime < oldest:
+                removed += 1
+                freed += stat.st_size
+                if not dry_run:
+                    os.remove(path)
+    return removed, freed
+
+
+def _hash_file(f):
+    digest, size = hashlib.sha256(), 0
+    for chunk in f.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def adopt_legacy(dry_run=False):
+    """
+    Moves submissions stored before the blob store into it, deduplicating
+    them, and deletes their old copies. Returns (submissions adopted, bytes
+    freed).
+    """
+    storage = _storage()
+    adopted, freed, seen = 0, 0, set()
+    for submission in TeamSubmission.objects.filter(blob__isnull=True).exclude(file=''):
+        old_name = submission.file.name
+        if not storage.exists(old_name):
+            continue
+        with storage.open(old_name, 'rb') as f:
+            sha256, size = _hash_file(f)
+        adopted += 1
+        if sha256 in seen or SubmissionBlob.objects.filter(pk=sha256).exists():
+            freed += size
+        seen.add(sha256)
+        if dry_run:
+            continue
+        with transaction.atomic():
+            blob, _ = SubmissionBlob.objects.select_for_update().get_or_create(
+                sha256=sha256, defaults={'size': size, 'file': blob_name(sha256, os.path.splitext(old_name)[1])})
+            if not storage.exists(blob.file.name):
+                with storage.open(old_name, 'rb') as f:
+                    storage.save(blob.file.name, f)
+            SubmissionBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+            TeamSubmission.objects.filter(pk=submission.pk).update(
+                blob=blob, file=blob.file.name, sha256=sha256, size=size,
+                original_name=submission.original_name or os.path.basename(old_name))
+            transaction.on_commit(lambda name=old_name: storage.delete(name))
+    return adopted, freed
@@ -0,0 +1,124 @@
+"""
+Vectorized whole-cohort scoring.
+
+A Cohort pulls the raw mark columns of a TeamMember queryset with a single
+values_list() query into NumPy arrays and computes every calculated mark of
+settings.EVALX_RUBRIC column-wise: evaluator totals with their absent masks,
+review consolidations, the averages and final_internal_75. No model
+instances are created, and the results are bit-identical to the TeamMember
+properties and with_totals() (same operands, same order of additions).
+
+The PDF member reports and the analytics use it when NumPy is installed;
+the PDFs fall back to the SQL annotations otherwise. It holds the whole
+cohort in memory, so the Excel/CSV/Parquet exports stream the queryset
+instead.
+"""
+from .models import IDENTITY_FIELDS, MARK_FIELDS, SCORE_SOURCES
+from .rubric import EVALUATOR_LABELS, FINAL_COMPONENTS, get_rubric
+
+try:
+    import numpy as np
+except ImportError:  # optional: reports fall back to the SQL annotations
+    np = None
+
+RAW_FIELDS = tuple(sorted(MARK_FIELDS))
+TEXT_FIELDS = tuple(f for f in IDENTITY_FIELDS if f not in ('id', 'team_id', 'is_leader'))
+
+
+def _sum(arrays):
+    total = arrays[0]
+    for array in arrays[1:]:
+        total = total + array
+    return total
+
+
+def _weighted(arrays, weights):
+    return [a if w == 1 else a * w for a, w in zip(arrays, weights)]
+
+
+def score_arrays(marks, config=None):
+    """
+    Every calculated mark of the rubric as an array, from a dict of raw mark
+    arrays (float64; absent flags as 0.0/1.0).
+    """
+    config = config or get_rubric().config
+    scores = {}
+    for review, spec in config['reviews'].items():
+        names, weights, absent = [], [], []
+        for prefix, weight in spec['evaluators'].items():
+            name = f'{review}_{EVALUATOR_LABELS[prefix]}_total'
+            is_absent = marks[f'{review}_{prefix}_absent'] != 0
+            criteria = _sum([marks[f'{review}_{prefix}_{c}'] for c in spec['criteria']])
+            scores[name] = np.where(is_absent, 0.0, criteria)
+            names.append(name)
+            weights.append(float(weight))
+            absent.append(is_absent)
+        terms = _sum(_weighted([scores[n] for n in names], weights))
+        if spec.get('absent', 'zero') == 'zero':
+            scores[f'{review}_consolidated_40'] = terms / sum(weights)
+        else:
+            present = _sum([np.where(a, 0.0, w) for a, w in zip(absent, weights)])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores[f'{review}_consolidated_40'] = np.where(present == 0, 0.0, terms / present)
+
+    weights = [float(w) for w in config['review_weights'].values()]
+    scores['avg_evaluation_40'] = _sum(_weighted(
+        [scores[f'{review}_consolidated_40'] for review in config['review_weights']], weights)) / sum(weights)
+    scores['s2_total_live'] = _sum([marks[f] for f in config['sheet2']])
+    scores['consolidated_report_marks'] = _sum([marks[f] for f in config['report']]) / float(len(config['report']))
+    scores['attendance_total'] = _sum([marks[f] for f in config['attendance']])
+
+    weights = [float(w) for w in config['final'].values()]
+    scores['final_internal_75'] = _sum(_weighted(
+        [scores[FINAL_COMPONENTS[c]] for c in config['final']], weights))
+    return scores
+
+
+class Cohort:
+    """The marks of a set of members as columns, in queryset order."""
+
+    def __init__(self, ids, text, marks):
+        self.ids = ids
+        self.text = text        # identity field -> list of str
+        self.marks = marks      # raw mark field -> float64 array
+        self.scores = score_arrays(marks)
+        # Persisted score columns hold exactly their calculated mark
+        for column, source in SCORE_SOURCES.items():
+            self.scores.setdefault(column, self.scores[source])
+
+    @classmethod
+    def from_queryset(cls, queryset, extra=()):
+        """
+        One values_list() query; the queryset's filters and ordering are kept.
+        extra names further (possibly related) fields to load as text columns.
+        """
+        text_fields = TEXT_FIELDS + tuple(extra)
+        rows = list(queryset.values_list('id', *text_fields, *RAW_FIELDS))
+        n_text = 1 + len(text_fields)
+        text = {f: [row[i + 1] for row in rows] for i, f in enumerate(text_fields)}
+        numbers = np.array([row[n_text:] for row in rows], dtype=np.float64).reshape(len(rows), len(RAW_FIELDS))
+        marks = {f: numbers[:, i] for i, f in enumerate(RAW_FIELDS)}
+        return cls([row[0] for row in rows], text, marks)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def column(self, name):
+        """A calculated mark, raw mark or identity field as an array/list."""
+        if name == 'id':
+            return self.ids
+        if name in self.text:
+            return self.text[name]
+        if name in self.scores:
+            return self.scores[name]
+        return self.marks[name]
+
+    def rows(self, accessors):
+        """One list per member (the exports' row format)."""
+        columns = [self.column(a) for a in accessors]
+        columns = [c.tolist() if np is not None and isinstance(c, np.ndarray) else c for c in columns]
+        return (list(row) for row in zip(*columns))
+
+    def records(self, names):
+        """One dict per member, for templates that read member.<name>."""
+        return [dict(zip(names, row)) for row in self.rows(names)]
@@ -0,0 +1,166 @@
+"""
+Data loaders for the dashboards. Each loader runs a fixed number of queries
+however many teams are registered: guides are joined, members come from one
+prefetch of the listed columns only, and submissions are reduced to the
+latest upload per team and slot in SQL.
+"""
+import uuid
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+from django.db.models import Exists, F, OuterRef, Prefetch, Q, Window
+from django.db.models.functions import RowNumber
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DocumentSlot, Team, TeamMember, TeamSubmission, User
+
+# One cell of the coordinator's document grid. state is one of
+# 'submitted', 'overdue', 'open' or 'inactive'.
+DocumentBadge = namedtuple('DocumentBadge', 'code url is_late state')
+
+
+def member_prefetch():
+    """team.members.all with just the columns the dashboards print."""
+    return Prefetch(
+        'members',
+        queryset=TeamMember.objects.identity().order_by('reg_number'),
+    )
+
+
+def team_rows(teams):
+    """
+    Teams ready for a dashboard table: guide and login user joined, members
+    prefetched without the mark columns.
+    """
+    return teams.select_related('guide', 'user').prefetch_related(member_prefetch())
+
+
+def latest_submissions(team_ids):
+    """
+    {team_id: {slot_type: (download_url, status)}} for the most recent upload of
+    each team in each slot. team_ids may be a list or a values_list queryset.
+    """
+    rows = (
+        TeamSubmission.objects.filter(team_id__in=team_ids)
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=[F('team_id'), F('slot_id')],
+            order_by=F('submitted_at').desc(),
+        ))
+        .filter(rank=1)
+        .values_list('team_id', 'slot__slot_type', 'pk', 'status')
+    )
+    latest = defaultdict(dict)
+    for team_id, slot_type, pk, status in rows:
+        # Through the authorising download view, never the raw media URL
+        latest[team_id][slot_type] = (reverse('submission_file', args=[pk]), status)
+    return latest
+
+
+def attach_documents(teams, slots_dict, latest, now=None):
+    """Sets team.documents to one DocumentBadge per slot, in slots_dict order."""
+    now = now or timezone.now()
+    for team in teams:
+        team_files = latest.get(team.team_id, {})
+        badges = []
+        for code, slot in slots_dict.items():
+            if code in team_files:
+                url, status = team_files[code]
+                badges.append(DocumentBadge(code, url, status == "Late", 'submitted'))
+            elif not slot.is_active:
+                badges.append(DocumentBadge(code, None, False, 'inactive'))
+            elif slot.deadline is not None and slot.deadline < now:
+                badges.append(DocumentBadge(code, None, False, 'overdue'))
+            else:
+                badges.append(DocumentBadge(code, None, False, 'open'))
+        team.documents = badges
+
+
+TEAM_PAGE_SIZE = 50
+TEAM_MAX_PAGE_SIZE = 200
+
+
+def team_page(teams, params):
+    """
+    Keyset page of teams, newest registrations first.
+
+    GET params: ?after=<cursor> (see team_cursor), ?size=, ?guide=<guide id>,
+    ?approved=1|0, ?missing=<slot_type> (no upload in that slot yet),
+    ?late=1 (at least one late upload) and ?q= (team ID or member reg_number
+    prefix, or part of a member name).
+    Returns (page queryset, filters dict of the applied params, page size).
+    """
+    filters = {}
+    if params.get('guide'):
+        try:
+            teams = teams.filter(guide_id=uuid.UUID(params['guide']))
+            filters['guide'] = params['guide']
+        except ValueError:
+            pass
+    if params.get('approved') in ('1', '0'):
+        teams = teams.filter(is_approved=params['approved'] == '1')
+        filters['approved'] = params['approved']
+    if params.get('missing'):
+        teams = teams.exclude(Exists(TeamSubmission.objects.filter(
+            team=OuterRef('pk'), slot__slot_type=params['missing'])))
+        filters['missing'] = params['missing']
+    if params.get('late') == '1':
+        teams = teams.filter(Exists(TeamSubmission.objects.filter(team=OuterRef('pk'), status="Late")))
+        filters['late'] = '1'
+    q = params.get('q', '').strip()
+    if q:
+        member_match = TeamMember.objects.filter(
+            Q(reg_number__istartswith=q) | Q(name__icontains=q), team=OuterRef('pk'))
+        teams = teams.filter(Q(team_id__istartswith=q) | Exists(member_match))
+        filters['q'] = q
+
+    created_at, _, team_id = params.get('after', '').rpartition('|')
+    if team_id:
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except ValueError:
+            pass
+        else:
+            teams = teams.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, team_id__lt=team_id))
+
+    try:
+        size = min(int(params.get('size', TEAM_PAGE_SIZE)), TEAM_MAX_PAGE_SIZE)
+    except ValueError:
+        size = TEAM_PAGE_SIZE
+    size = max(size, 1)
+    return teams.order_by('-created_at', '-team_id')[:size], filters, size
+
+
+def team_cursor(teams, size):
+    """The ?after= value for the next page of team_page(), or None on the last page."""
+    if len(teams) < size:
+        return None
+    last = teams[-1]
+    return f"{last.created_at.isoformat()}|{last.team_id}"
+
+
+def coordinator_dashboard_data(teams, params):
+    """Context for one page of the coordinator's team registry table."""
+    page, filters, size = team_page(teams, params)
+    slots_dict = {slot.slot_type: slot for slot in DocumentSlot.objects.all()}
+    page = list(team_rows(page))
+    latest = latest_submissions([team.team_id for team in page])
+    attach_documents(page, slots_dict, latest)
+    return {
+        'teams': page,
+        'slots_dict': slots_dict,
+        'filters': filters,
+        'next_cursor': team_cursor(page, size),
+        'guides': User.objects.filter(role='GUIDE').order_by('email'),
+    }
+
+
+def hod_dashboard_data():
+    """Context for the HOD's list of every registered team."""
+    return {'teams': team_rows(Team.objects.order_by('team_id'))}
+
+
+def guide_dashboard_data(guide):
+    """Context for a guide's assigned teams."""
+    return {'teams': team_rows(Team.objects.filter(guide=guide).order_by('team_id'))}
@@ -0,0 +1,138 @@
+"""
+Protected file serving for submissions.
+
+submission_file checks that the user may see the submission (coordinators
+and the HOD see everything, a guide their own teams, a team its own
+uploads) and then serves it according to settings.EVALX_SENDFILE:
+
+* 'x-sendfile'   - X-Sendfile: <absolute path> (Apache mod_xsendfile,
+                   lighttpd); the front server streams the file.
+* 'x-accel'      - X-Accel-Redirect: EVALX_SENDFILE_PREFIX + <storage
+                   name>, percent-encoded (nginx, with an `internal`
+                   location mapped onto MEDIA_ROOT).
+* None (default) - Django streams it itself, with single-range requests,
+                   ETag and conditional GET.
+
+In every mode a conditional request is answered with 304 before any file
+is touched. The ETag is the content's SHA-256, so it is stable across
+resubmissions of the same file. MEDIA_ROOT must not be served publicly in
+production for the check to mean anything.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+# Browsers open these in a tab; anything else is downloaded
+INLINE_TYPES = ('application/pdf',)
+
+
+def can_view(user, submission):
+    if user.role in ('COORDINATOR', 'HOD'):
+        return True
+    if user.role == 'GUIDE':
+        return submission.team.guide_id == user.pk
+    if user.role == 'TEAM':
+        return submission.team.user_id == user.pk
+    return False
+
+
+def etag_for(submission, stat):
+    if submission.sha256:
+        return f'"{submission.sha256}"'
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single satisfiable byte range, None to
+    serve the whole file (no header, or several ranges), or 'unsatisfiable'.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last n bytes
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return 'unsatisfiable'
+    return start, end
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            block = f.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def serve_submission(request, submission):
+    storage = submission.file.storage
+    name = submission.file.name
+    path = storage.path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return HttpResponse("The file is no longer available.", status=404)
+
+    etag = etag_for(submission, stat)
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if conditional is not None:
+        return conditional
+
+    filename = submission.original_name or os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    mode = settings.EVALX_SENDFILE
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    elif mode == 'x-accel':
+        response = HttpResponse(content_type=content_type)
+        # A URI path: legacy names may contain spaces, '#', '?' or '%'
+        response['X-Accel-Redirect'] = quote(settings.EVALX_SENDFILE_PREFIX.rstrip('/') + '/' + name)
+    else:
+        byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+        # If-Range: only honour the range if the client's copy is current
+        if_range = request.headers.get('If-Range')
+        if byte_range and if_range and if_range != etag:
+            byte_range = None
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            # Whole file: FileResponse uses the server's wsgi.file_wrapper
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Content-Disposition'] = content_disposition_header(content_type not in INLINE_TYPES, filename)
+    # Per-user authorisation: never cache in shared caches
+    patch_cache_control(response, private=True, max_age=3600)
+    return response
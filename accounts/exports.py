@@ -0,0 +1,292 @@
+"""
+Streaming exports for the consolidated reports.
+
+The XLSX writer below streams a minimal SpreadsheetML package straight into
+the response: rows are pulled from a chunked queryset iterator, written into
+a deflated zip entry and flushed to the client as they are produced, so
+memory stays flat and the download starts immediately. CSV is streamed the
+same way; Parquet is written one row group per chunk to a temporary file.
+
+All formats take the (header, accessor) column lists from reports.py.
+"""
+import csv
+import re
+import tempfile
+import zipfile
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from django.db.models.query import QuerySet
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for ?format=parquet
+    pa = pq = None
+
+EXPORT_CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Control characters that XML 1.0 does not allow, even escaped
+XML_ILLEGAL_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def iterate_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Iterates a queryset in chunks (prefetches are applied per chunk)."""
+    if isinstance(queryset, QuerySet):
+        return queryset.iterator(chunk_size=chunk_size)
+    return iter(queryset)
+
+
+def report_rows(queryset, columns):
+    """
+    Yields one list of cell values per object. When every accessor is a
+    plain attribute name the rows come straight from values_list(), so no
+    model instances are built at all.
+    """
+    accessors = [accessor for _, accessor in columns]
+    if isinstance(queryset, QuerySet) and all(isinstance(a, str) for a in accessors):
+        yield from iterate_rows(queryset.values_list(*accessors))
+        return
+    for obj in iterate_rows(queryset):
+        yield [a(obj) if callable(a) else getattr(obj, a) for a in accessors]
+
+
+# ==========================================================
+# XLSX
+# ==========================================================
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Style 0 is the default, style 1 is the bold header font
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+class _StreamSink:
+    """Write-only, non-seekable file object that ZipFile streams into."""
+
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def pending(self):
+        return self._size
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks, self._size = [], 0
+        return data
+
+
+def _column_letter(index):
+    letters = ''
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _xml_text(value):
+    return escape(XML_ILLEGAL_CHARS.sub('', str(value)))
+
+
+def _xlsx_row(row_number, values, style=0):
+    cells = []
+    style_attr = f' s="{style}"' if style else ''
+    for col, value in enumerate(values, 1):
+        if value is None:
+            continue
+        ref = f'{_column_letter(col)}{row_number}'
+        if isinstance(value, bool):
+            cells.append(f'<c r="{ref}" t="b"{style_attr}><v>{int(value)}</v></c>')
+        elif isinstance(value, (int, float)):
+            cells.append(f'<c r="{ref}"{style_attr}><v>{value!r}</v></c>')
+        else:
+            text = _xml_text(value)
+            cells.append(f'<c r="{ref}" t="inlineStr"{style_attr}><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{row_number}">{"".join(cells)}</row>'
+
+
+def stream_xlsx(headers, rows, sheet_name="Sheet1"):
+    """Yields the bytes of a single-sheet XLSX file as the rows are produced."""
+    sink = _StreamSink()
+    sheet_name = escape(XML_ILLEGAL_CHARS.sub('', sheet_name)[:31], {'"': '&quot;'})
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _ROOT_RELS)
+        zf.writestr('xl/workbook.xml', _WORKBOOK.format(name=sheet_name))
+        zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        zf.writestr('xl/styles.xml', _STYLES)
+        yield sink.drain()
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(_SHEET_HEAD.encode())
+            sheet.write(_xlsx_row(1, headers, style=1).encode())
+            for row_number, values in enumerate(rows, 2):
+                sheet.write(_xlsx_row(row_number, values).encode())
+                if sink.pending() >= FLUSH_BYTES:
+                    yield sink.drain()
+            sheet.write(_SHEET_TAIL.encode())
+    yield sink.drain()
+
+
+def export_to_excel(headers, rows, filename, sheet_name):
+    """Streams an Excel download of the given rows."""
+    response = StreamingHttpResponse(stream_xlsx(headers, rows, sheet_name), content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename={filename}.xlsx'
+    return response
+
+
+# ==========================================================
+# CSV
+# ==========================================================
+
+class _Echo:
+    """csv.writer target that hands each formatted line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(headers, rows, batch=500):
+    """Yields CSV text, a batch of rows at a time."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    rows = iter(rows)
+    while True:
+        lines = [writer.writerow(row) for row in islice(rows, batch)]
+        if not lines:
+            break
+        yield ''.join(lines)
+
+
+def export_to_csv(headers, rows, filename):
+    response = StreamingHttpResponse(stream_csv(headers, rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename={filename}.csv'
+    return response
+
+
+# ==========================================================
+# PARQUET
+# ==========================================================
+
+def export_to_parquet(headers, rows, filename, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Writes the rows as a Parquet file, one row group per chunk. The file is
+    built in an anonymous temporary file (Parquet needs its footer written
+    last, so it cannot be streamed) and then served from disk.
+    """
+    if pq is None:
+        return HttpResponse("Parquet export needs the optional 'pyarrow' package.", status=501, content_type='text/plain')
+
+    output = tempfile.TemporaryFile()
+    try:
+        writer, schema = None, None
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk and writer is not None:
+                break
+            data = {header: [row[i] for row in chunk] for i, header in enumerate(headers)}
+            table = pa.Table.from_pydict(data, schema=schema)
+            if writer is None:
+                schema = table.schema
+                writer = pq.ParquetWriter(output, schema)
+            if chunk:
+                writer.write_table(table)
+            if len(chunk) < chunk_size:
+                break
+        writer.close()
+        output.seek(0)
+    except BaseException:
+        output.close()
+        raise
+
+    # FileResponse closes (and so deletes) the temporary file when done
+    return FileResponse(output, as_attachment=True, filename=f'{filename}.parquet',
+                        content_type='application/vnd.apache.parquet')
+
+
+EXPORT_FORMATS = ('excel', 'csv', 'parquet')
+
+
+def export_report(fmt, queryset, columns, filename, sheet_name):
+    """
+    Builds the ?format= download for a report from its column definitions.
+    Returns None for formats that are not data exports (i.e. the PDF).
+    """
+    if fmt not in EXPORT_FORMATS:
+        return None
+    headers = [header for header, _ in columns]
+    rows = report_rows(queryset, columns)
+    if fmt == 'excel':
+        return export_to_excel(headers, rows, filename, sheet_name)
+    if fmt == 'csv':
+        return export_to_csv(headers, rows, filename)
+    return export_to_parquet(headers, rows, filename)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from accounts.blobs import adopt_legacy, collect_garbage, recount
+from accounts.resumable import expire_sessions
+
+
+class Command(BaseCommand):
+    help = "Deletes submission blobs no submission refers to, abandoned uploads and expired upload sessions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be removed.")
+        parser.add_argument('--recount', action='store_true', help="Rebuild every ref_count from the submissions first.")
+        parser.add_argument('--adopt-legacy', action='store_true',
+                            help="Move submissions stored before the blob store into it, removing duplicate copies.")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if options['adopt_legacy']:
+            adopted, freed = adopt_legacy(dry_run=dry_run)
+            self.stdout.write(f"Adopted {adopted} legacy submission(s), {freed / 1024 / 1024:.1f} MB of duplicates.")
+        if options['recount'] and not dry_run:
+            self.stdout.write(f"Corrected {recount()} reference count(s).")
+        if not dry_run:
+            self.stdout.write(f"Expired {expire_sessions()} unfinished upload session(s).")
+        removed, freed = collect_garbage(dry_run=dry_run)
+        verb = "Would remove" if dry_run else "Removed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} file(s), {freed / 1024 / 1024:.1f} MB."))
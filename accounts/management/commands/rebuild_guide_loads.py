@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts.allocation import rebuild_guide_loads
+
+
+class Command(BaseCommand):
+    help = "Recounts the teams allocated to each guide (after teams were reassigned with queryset update() or raw SQL)."
+
+    def handle(self, *args, **options):
+        count = rebuild_guide_loads()
+        self.stdout.write(self.style.SUCCESS(f"Recounted the teams of {count} guide(s)."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import TeamMember
+
+
+class Command(BaseCommand):
+    help = "Rewrites the stale persisted TeamMember score columns, or only reports them with --verify."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help="Only report rows whose stored scores are stale.")
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            stale = TeamMember.objects.score_mismatches()
+            count = stale.count()
+            for reg_number in stale.values_list('reg_number', flat=True)[:20]:
+                self.stdout.write(f"  stale: {reg_number}")
+            if count:
+                raise CommandError(f"{count} student(s) have stale score columns. Run recompute_scores to fix.")
+            self.stdout.write(self.style.SUCCESS("All persisted scores match the raw marks."))
+            return
+
+        # Only stale rows: bumping updated_at everywhere would invalidate
+        # every cached report (see report_cache.data_version)
+        updated = TeamMember.objects.score_mismatches().recompute_scores()
+        self.stdout.write(self.style.SUCCESS(f"Recomputed scores for {updated} student(s)."))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.report_jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Renders queued PDF report jobs in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.REPORT_WORKER_PROCESSES)
+        parser.add_argument('--poll', type=float, default=2.0, help="Seconds between queue polls.")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Report worker started with {options['workers']} process(es).")
+        run_worker(
+            workers=options['workers'],
+            once=options['once'],
+            poll_interval=options['poll'],
+            log=self.stdout.write,
+        )
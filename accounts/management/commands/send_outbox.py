@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from accounts.outbox import run_outbox
+
+
+class Command(BaseCommand):
+    help = "Sends queued notification emails over one reused connection, with retries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help="Messages claimed per batch.")
+        parser.add_argument('--rate', type=float, default=5.0, help="Messages per second (0 for no limit).")
+        parser.add_argument('--poll', type=float, default=5.0, help="Seconds between queue polls.")
+        parser.add_argument('--once', action='store_true', help="Exit once nothing is due.")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Outbox worker started.")
+        sent = run_outbox(
+            batch_size=options['batch_size'],
+            rate=options['rate'] or None,
+            once=options['once'],
+            poll_interval=options['poll'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} message(s)."))
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:57
+
+from django.db import migrations, models
+from django.db.models import Case, F, FloatField, Value, When
+
+
+def backfill_scores(apps, schema_editor):
+    # Frozen copy of TeamMemberQuerySet.recompute_scores() at this migration
+    TeamMember = apps.get_model('accounts', 'TeamMember')
+
+    def total(prefix):
+        marks = F(f'{prefix}_comp') + F(f'{prefix}_func') + F(f'{prefix}_pres') + F(f'{prefix}_oral') + F(f'{prefix}_know')
+        return Case(When(**{f'{prefix}_absent': True}, then=Value(0.0)), default=marks, output_field=FloatField())
+
+    r1 = (total('r1_c') + total('r1_h') + total('r1_g')) / Value(3.0)
+    r2 = (total('r2_c') + total('r2_h') + total('r2_g')) / Value(3.0)
+    report = (F('report_guide') + F('report_coord') + F('report_hod')) / Value(3.0)
+    s2 = F('s2_teamwork') + F('s2_tech_know') + F('s2_regularity')
+    TeamMember.objects.update(
+        r1_consolidated=r1,
+        r2_consolidated=r2,
+        s2_total=s2,
+        report_consolidated=report,
+        final_internal=s2 + report + (r1 + r2) / Value(2.0) + F('attendance_marks'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_alter_team_guide_alter_team_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teammember',
+            name='final_internal',
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='teammember',
+            name='r1_consolidated',
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='teammember',
+            name='r2_consolidated',
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='teammember',
+            name='report_consolidated',
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='teammember',
+            name='s2_total',
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_updated_at_timestamps'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='team',
+            name='is_approved',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name='teamsubmission',
+            name='status',
+            field=models.CharField(blank=True, db_index=True, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(fields=['created_at', 'team_id'], name='team_created_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teamsubmission',
+            index=models.Index(fields=['team', 'slot', '-submitted_at'], name='submission_team_slot_idx'),
+        ),
+    ]
@@ -0,0 +1,200 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:19
+
+import accounts.rubric
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_dashboard_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='teammember',
+            name='attendance_marks',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('attendance_marks')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_c_comp',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_c_comp')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_c_func',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_c_func')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_c_know',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_c_know')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_c_oral',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_c_oral')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_c_pres',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_c_pres')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_g_comp',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_g_comp')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_g_func',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_g_func')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_g_know',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_g_know')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_g_oral',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_g_oral')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_g_pres',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_g_pres')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_h_comp',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_h_comp')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_h_func',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_h_func')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_h_know',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_h_know')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_h_oral',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_h_oral')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r1_h_pres',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r1_h_pres')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_c_comp',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_c_comp')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_c_func',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_c_func')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_c_know',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_c_know')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_c_oral',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_c_oral')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_c_pres',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_c_pres')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_g_comp',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_g_comp')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_g_func',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_g_func')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_g_know',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_g_know')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_g_oral',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_g_oral')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_g_pres',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_g_pres')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_h_comp',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_h_comp')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_h_func',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_h_func')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_h_know',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_h_know')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_h_oral',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_h_oral')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='r2_h_pres',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('r2_h_pres')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='report_coord',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('report_coord')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='report_guide',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('report_guide')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='report_hod',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('report_hod')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='s2_regularity',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('s2_regularity')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='s2_teamwork',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('s2_teamwork')]),
+        ),
+        migrations.AlterField(
+            model_name='teammember',
+            name='s2_tech_know',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0), accounts.rubric.RubricMaxValidator('s2_tech_know')]),
+        ),
+    ]
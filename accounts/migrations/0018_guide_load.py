@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_guide_teams(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    GuideLoad = apps.get_model('accounts', 'GuideLoad')
+    guides = User.objects.filter(role='GUIDE').annotate(n=models.Count('team_profile'))
+    GuideLoad.objects.bulk_create([GuideLoad(guide_id=guide.pk, team_count=guide.n) for guide in guides])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_rubric_validators'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuideLoad',
+            fields=[
+                ('guide', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='guide_load', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('team_count', models.PositiveIntegerField(default=0)),
+                ('capacity', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['team_count', 'guide'], name='guide_load_order_idx')],
+            },
+        ),
+        migrations.RunPython(count_guide_teams, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_guide_load'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamIdSequence',
+            fields=[
+                ('prefix', models.CharField(max_length=8, primary_key=True, serialize=False)),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_outbound_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teamsubmission',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='teamsubmission',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
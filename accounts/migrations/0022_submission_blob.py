@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_submission_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionBlob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('file', models.FileField(max_length=255, upload_to='submissions/blobs/')),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(db_index=True, default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='teamsubmission',
+            name='original_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='teamsubmission',
+            name='file',
+            field=models.FileField(max_length=255, upload_to='submissions/'),
+        ),
+        migrations.AddField(
+            model_name='teamsubmission',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='submissions', to='accounts.submissionblob'),
+        ),
+    ]
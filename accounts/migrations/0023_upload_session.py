@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:34
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_submission_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_name', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('received', models.BigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('COMPLETE', 'Complete'), ('EXPIRED', 'Expired')], default='ACTIVE', max_length=10)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.documentslot')),
+                ('submission', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='accounts.teamsubmission')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='accounts.team')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='upload_session_expiry_idx')],
+            },
+        ),
+    ]
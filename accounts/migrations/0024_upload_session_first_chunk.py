@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+def backfill_first_chunk(apps, schema_editor):
+    # Sessions already under way were judged by their start
+    UploadSession = apps.get_model('accounts', 'UploadSession')
+    UploadSession.objects.filter(received__gt=0).update(first_chunk_at=models.F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0023_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='first_chunk_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_first_chunk, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:10
+
+import os
+import shutil
+
+import accounts.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_report_files(apps, schema_editor):
+    # Reports rendered before this migration sit in the public MEDIA_ROOT
+    ReportJob = apps.get_model('accounts', 'ReportJob')
+    for name in ReportJob.objects.exclude(file='').values_list('file', flat=True):
+        old = os.path.join(settings.MEDIA_ROOT, name)
+        if os.path.exists(old):
+            new = os.path.join(settings.REPORT_JOB_DIR, name)
+            os.makedirs(os.path.dirname(new), exist_ok=True)
+            shutil.move(old, new)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0024_upload_session_first_chunk'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportjob',
+            name='file',
+            field=models.FileField(blank=True, storage=accounts.models.ReportJobStorage(), upload_to='reports/'),
+        ),
+        migrations.RunPython(move_report_files, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,18 @@
+import os
 import uuid
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.db.models import F, Q
+from django.db.models.functions import Abs, Now
 from django.utils import timezone
+from django.utils.deconstruct import deconstructible
 from django.contrib.auth.models import AbstractUser
-from django.core.validators import MaxValueValidator, MinValueValidator
+from django.core.validators import MinValueValidator
+
+from .rubric import RubricMaxValidator, get_rubric, rubric_scorer
 
 class User(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -20,6 +30,13 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.email} ({self.role})"
 
+class TouchingQuerySet(models.QuerySet):
+    """update() also bumps updated_at, which feeds the report cache fingerprint."""
+
+    def update(self, **kwargs):
+        kwargs.setdefault('updated_at', Now())
+        return super().update(**kwargs)
+
 class Team(models.Model):
     team_id = models.CharField(max_length=10, primary_key=True)
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='student_profile')
@@ -31,12 +48,243 @@ class Team(models.Model):
     )
     leader_name = models.CharField(max_length=100, blank=True, null=True)
     project_title = models.CharField(max_length=255, blank=True, null=True)
-    is_approved = models.BooleanField(default=False)
+    is_approved = models.BooleanField(default=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TouchingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset order of the coordinator dashboard (newest first)
+            models.Index(fields=['created_at', 'team_id'], name='team_created_keyset_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Compared on save to move the team between GuideLoad counters
+        instance._loaded_guide_id = instance.__dict__.get('guide_id')
+        return instance
 
     def __str__(self):
         return self.team_id
 
+class GuideLoad(models.Model):
+    """
+    Number of teams allocated to a guide, kept alongside the guide so that
+    registration reads one small row instead of counting every team (see
+    allocation.py). capacity overrides settings.EVALX_GUIDE_CAPACITY.
+    """
+    guide = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='guide_load')
+    team_count = models.PositiveIntegerField(default=0)
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Least-loaded guide first
+            models.Index(fields=['team_count', 'guide'], name='guide_load_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.guide_id}: {self.team_count}"
+
+def _adjust_guide_load(guide_id, delta):
+    # A guide without a GuideLoad row yet is counted from scratch by
+    # allocation.ensure_guide_loads()
+    loads = GuideLoad.objects.filter(pk=guide_id)
+    if delta < 0:
+        loads = loads.filter(team_count__gt=0)
+    loads.update(team_count=F('team_count') + delta)
+
+@receiver(post_delete, sender=Team)
+def _release_guide_slot(sender, instance, **kwargs):
+    # Also runs for cascades (the team's user deleted)
+    if instance.guide_id:
+        _adjust_guide_load(instance.guide_id, -1)
+
+@receiver(post_save, sender=Team)
+def _move_guide_slot(sender, instance, created, update_fields=None, **kwargs):
+    # New teams are counted by allocation.allocate_guide(); queryset
+    # update() of the guide bypasses this (see rebuild_guide_loads)
+    if update_fields is not None and 'guide' not in update_fields and 'guide_id' not in update_fields:
+        return
+    previous = getattr(instance, '_loaded_guide_id', None)
+    if not created and instance.guide_id != previous:
+        if previous:
+            _adjust_guide_load(previous, -1)
+        if instance.guide_id:
+            _adjust_guide_load(instance.guide_id, 1)
+    instance._loaded_guide_id = instance.guide_id
+
+class TeamIdSequence(models.Model):
+    """Last team number handed out under a team ID prefix (see allocation.next_team_id)."""
+    prefix = models.CharField(max_length=8, primary_key=True)
+    last_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.prefix}: {self.last_value}"
+
+# ==========================================================
+# SQL-SIDE MARK TOTALS
+# ==========================================================
+
+class annotated_property:
+    """
+    Computed property that steps aside when a queryset annotation of the
+    same name has been loaded onto the instance (see with_totals()).
+
+    A non-data descriptor on purpose: the instance __dict__ wins, which is
+    how annotations take over. Assigning to it therefore does not raise; it
+    shadows the computed value on that instance.
+    """
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return self.func(instance)
+
+
+def _mark_expressions():
+    """
+    Every calculated mark as a SQL expression, keyed by the TeamMember
+    property it mirrors, compiled from settings.EVALX_RUBRIC (see rubric.py).
+    Each expression is self-contained (no references to other annotations)
+    so it can be used in annotate() as well as update().
+    """
+    return get_rubric().expressions()
+
+
+# Raw mark fields that feed the calculated totals
+MARK_FIELDS = frozenset(
+    [f'{review}_{role}_{field}' for review in ('r1', 'r2') for role in ('c', 'h', 'g')
+     for field in ('comp', 'func', 'pres', 'oral', 'know', 'absent')]
+    + ['s2_teamwork', 's2_tech_know', 's2_regularity', 'report_guide', 'report_coord', 'report_hod', 'attendance_marks']
+)
+
+# Persisted score column -> calculated mark it stores
+SCORE_SOURCES = {
+    'r1_consolidated': 'r1_consolidated_40',
+    'r2_consolidated': 'r2_consolidated_40',
+    's2_total': 's2_total_live',
+    'report_consolidated': 'consolidated_report_marks',
+    'final_internal': 'final_internal_75',
+}
+
+
+# Named column sets for TeamMember.objects.projection(). Views and reports
+# load the narrowest one they need instead of the full ~50-column row.
+IDENTITY_FIELDS = ('id', 'team_id', 'name', 'reg_number', 'is_leader')
+PROJECTIONS = {
+    'identity': IDENTITY_FIELDS,
+    'review1': IDENTITY_FIELDS + tuple(sorted(f for f in MARK_FIELDS if f.startswith('r1_'))) + ('r1_consolidated',),
+    'review2': IDENTITY_FIELDS + tuple(sorted(f for f in MARK_FIELDS if f.startswith('r2_'))) + ('r2_consolidated',),
+    'sheet2': IDENTITY_FIELDS + ('s2_teamwork', 's2_tech_know', 's2_regularity', 's2_total'),
+    'report': IDENTITY_FIELDS + ('report_guide', 'report_coord', 'report_hod', 'report_consolidated'),
+    'attendance': IDENTITY_FIELDS + ('attendance_marks',),
+    'final': IDENTITY_FIELDS + ('attendance_marks',) + tuple(SCORE_SOURCES),
+}
+
+
+def _load_deferred_marks(objs):
+    """
+    Fetches the mark fields deferred on any of objs (e.g. loaded with a
+    projection) in one query, so refresh_scores() can read them without a
+    deferred load per field and row.
+    """
+    pending = [obj for obj in objs if obj.pk is not None and not MARK_FIELDS.isdisjoint(obj.get_deferred_fields())]
+    if not pending:
+        return
+    missing = sorted(set().union(*(MARK_FIELDS & obj.get_deferred_fields() for obj in pending)))
+    rows = {row['pk']: row for row in
+            type(pending[0])._base_manager.filter(pk__in=[obj.pk for obj in pending]).values('pk', *missing)}
+    for obj in pending:
+        loaded = dict(zip(sorted(MARK_FIELDS), getattr(obj, '_loaded_marks', None) or ()))
+        for field in MARK_FIELDS & obj.get_deferred_fields():
+            obj.__dict__[field] = loaded[field] = rows[obj.pk][field]
+        if hasattr(obj, '_loaded_marks'):
+            obj._loaded_marks = tuple(loaded.get(f) for f in sorted(MARK_FIELDS))
+
+
+class TeamMemberQuerySet(TouchingQuerySet):
+
+    def projection(self, name):
+        """Loads only the columns of the named PROJECTIONS entry; the rest are deferred."""
+        return self.only(*PROJECTIONS[name])
+
+    def identity(self):
+        return self.projection('identity')
+
+    def review1_sheet(self):
+        return self.projection('review1')
+
+    def review2_sheet(self):
+        return self.projection('review2')
+
+    def sheet2(self):
+        return self.projection('sheet2')
+
+    def report_sheet(self):
+        return self.projection('report')
+
+    def final_sheet(self):
+        return self.projection('final')
+
+    def with_totals(self):
+        """
+        Annotates every calculated mark as a SQL expression. The annotations
+        use the same names as the TeamMember properties, so templates and
+        exports read them unchanged without any per-row Python arithmetic.
+        """
+        return self.annotate(**_mark_expressions())
+
+    def recompute_scores(self):
+        """
+        Rewrites the persisted score columns in a single UPDATE. Use this after
+        any queryset.update() that touches mark fields, since update() skips save().
+        """
+        expressions = _mark_expressions()
+        return self.update(updated_at=Now(), **{col: expressions[src] for col, src in SCORE_SOURCES.items()})
+
+    def score_mismatches(self, tolerance=1e-6):
+        """Rows whose persisted score columns disagree with the raw marks."""
+        expressions = _mark_expressions()
+        stale = Q()
+        for col, src in SCORE_SOURCES.items():
+            stale |= Q(**{f'{col}_diff__gt': tolerance})
+        return self.alias(**{
+            f'{col}_diff': Abs(F(col) - expressions[src]) for col, src in SCORE_SOURCES.items()
+        }).filter(stale)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.refresh_scores()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = list(fields)
+        objs = list(objs)
+        if not MARK_FIELDS.isdisjoint(fields):
+            _load_deferred_marks(objs)
+            for obj in objs:
+                obj.refresh_scores()
+            fields += [col for col in SCORE_SOURCES if col not in fields]
+        # auto_now is not applied by bulk_update()
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+        if 'updated_at' not in fields:
+            fields.append('updated_at')
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        for obj in objs:
+            obj._loaded_marks = obj._mark_snapshot()
+        return updated
+
+
 class TeamMember(models.Model):
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='members')
     name = models.CharField(max_length=100)
@@ -47,148 +295,155 @@ class TeamMember(models.Model):
     # EVALUATION SHEET 1 - REVIEW 1 (40 Marks each)
     # ==========================================================
     # COORDINATOR REVIEW 1
-    r1_c_comp = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    r1_c_func = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    r1_c_pres = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    r1_c_oral = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    r1_c_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
+    r1_c_comp = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_c_comp')])
+    r1_c_func = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_c_func')])
+    r1_c_pres = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_c_pres')])
+    r1_c_oral = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_c_oral')])
+    r1_c_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_c_know')])
     r1_c_absent = models.BooleanField(default=False)
 
     # HOD REVIEW 1
-    r1_h_comp = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    r1_h_func = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    r1_h_pres = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    r1_h_oral = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    r1_h_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
+    r1_h_comp = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_h_comp')])
+    r1_h_func = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_h_func')])
+    r1_h_pres = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_h_pres')])
+    r1_h_oral = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_h_oral')])
+    r1_h_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_h_know')])
     r1_h_absent = models.BooleanField(default=False)
 
     # GUIDE REVIEW 1
-    r1_g_comp = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    r1_g_func = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    r1_g_pres = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    r1_g_oral = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    r1_g_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
+    r1_g_comp = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_g_comp')])
+    r1_g_func = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_g_func')])
+    r1_g_pres = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_g_pres')])
+    r1_g_oral = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_g_oral')])
+    r1_g_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r1_g_know')])
     r1_g_absent = models.BooleanField(default=False)
 
     # ==========================================================
     # EVALUATION SHEET 1 - REVIEW 2 (40 Marks each)
     # ==========================================================
     # COORDINATOR REVIEW 2
-    r2_c_comp = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    r2_c_func = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    r2_c_pres = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    r2_c_oral = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    r2_c_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
+    r2_c_comp = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_c_comp')])
+    r2_c_func = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_c_func')])
+    r2_c_pres = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_c_pres')])
+    r2_c_oral = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_c_oral')])
+    r2_c_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_c_know')])
     r2_c_absent = models.BooleanField(default=False)
 
     # HOD REVIEW 2
-    r2_h_comp = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    r2_h_func = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    r2_h_pres = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    r2_h_oral = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    r2_h_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
+    r2_h_comp = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_h_comp')])
+    r2_h_func = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_h_func')])
+    r2_h_pres = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_h_pres')])
+    r2_h_oral = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_h_oral')])
+    r2_h_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_h_know')])
     r2_h_absent = models.BooleanField(default=False)
 
     # GUIDE REVIEW 2
-    r2_g_comp = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    r2_g_func = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    r2_g_pres = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    r2_g_oral = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    r2_g_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
+    r2_g_comp = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_g_comp')])
+    r2_g_func = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_g_func')])
+    r2_g_pres = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_g_pres')])
+    r2_g_oral = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_g_oral')])
+    r2_g_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('r2_g_know')])
     r2_g_absent = models.BooleanField(default=False)
 
     # ==========================================================
     # EVALUATION SHEET 2 (COORDINATOR ONLY - 15 Marks)
     # ==========================================================
-    s2_teamwork = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(4)])
-    s2_tech_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(6)])
-    s2_regularity = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
+    s2_teamwork = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('s2_teamwork')])
+    s2_tech_know = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('s2_tech_know')])
+    s2_regularity = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('s2_regularity')])
 
     # ==========================================================
     # REPORT MARKS & ATTENDANCE
     # ==========================================================
-    report_guide = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    report_coord = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
-    report_hod = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
+    report_guide = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('report_guide')])
+    report_coord = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('report_coord')])
+    report_hod = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('report_hod')])
     
     # Attendance entered manually by Coordinator (10)
-    attendance_marks = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(10)])
+    attendance_marks = models.FloatField(default=0.0, validators=[MinValueValidator(0), RubricMaxValidator('attendance_marks')])
 
     # ==========================================================
-    # CALCULATION PROPERTIES
+    # PERSISTED SCORES (kept in sync by save()/bulk_update())
     # ==========================================================
+    r1_consolidated = models.FloatField(default=0.0, db_index=True, editable=False)
+    r2_consolidated = models.FloatField(default=0.0, db_index=True, editable=False)
+    s2_total = models.FloatField(default=0.0, db_index=True, editable=False)
+    report_consolidated = models.FloatField(default=0.0, db_index=True, editable=False)
+    final_internal = models.FloatField(default=0.0, db_index=True, editable=False)
 
-    @property
-    def r1_coord_total(self):
-        if self.r1_c_absent: return 0.0
-        return (self.r1_c_comp or 0) + (self.r1_c_func or 0) + (self.r1_c_pres or 0) + (self.r1_c_oral or 0) + (self.r1_c_know or 0)
+    # Bumped by save(), bulk_update() and update(); feeds the report
+    # cache's data-version fingerprint
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
-    @property
-    def r1_hod_total(self):
-        if self.r1_h_absent: return 0.0
-        return (self.r1_h_comp or 0) + (self.r1_h_func or 0) + (self.r1_h_pres or 0) + (self.r1_h_oral or 0) + (self.r1_h_know or 0)
+    objects = TeamMemberQuerySet.as_manager()
 
-    @property
-    def r1_guide_total(self):
-        if self.r1_g_absent: return 0.0
-        return (self.r1_g_comp or 0) + (self.r1_g_func or 0) + (self.r1_g_pres or 0) + (self.r1_g_oral or 0) + (self.r1_g_know or 0)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_marks = instance._mark_snapshot()
+        return instance
 
-    @property
-    def r1_consolidated_40(self):
-        """Average of Coordinator, HOD, and Guide for Review 1."""
-        marks = [self.r1_coord_total, self.r1_hod_total, self.r1_guide_total]
-        return sum(marks) / 3.0
-
-    @property
-    def r2_coord_total(self):
-        if self.r2_c_absent: return 0.0
-        return (self.r2_c_comp or 0) + (self.r2_c_func or 0) + (self.r2_c_pres or 0) + (self.r2_c_oral or 0) + (self.r2_c_know or 0)
-
-    @property
-    def r2_hod_total(self):
-        if self.r2_h_absent: return 0.0
-        return (self.r2_h_comp or 0) + (self.r2_h_func or 0) + (self.r2_h_pres or 0) + (self.r2_h_oral or 0) + (self.r2_h_know or 0)
-
-    @property
-    def r2_guide_total(self):
-        if self.r2_g_absent: return 0.0
-        return (self.r2_g_comp or 0) + (self.r2_g_func or 0) + (self.r2_g_pres or 0) + (self.r2_g_oral or 0) + (self.r2_g_know or 0)
+    def _mark_snapshot(self):
+        # Reads __dict__ directly so deferred fields are not fetched
+        return tuple(self.__dict__.get(f) for f in sorted(MARK_FIELDS))
 
-    @property
-    def r2_consolidated_40(self):
-        """Average for Review 2 - Fixed to ensure data shows even if partially filled."""
-        marks = [self.r2_coord_total, self.r2_hod_total, self.r2_guide_total]
-        return sum(marks) / 3.0
+    def refresh_scores(self):
+        """
+        Recomputes the persisted score columns; returns the ones that changed.
+        Every mark field must be loaded (see _load_deferred_marks()).
+        """
+        deferred = MARK_FIELDS & self.get_deferred_fields()
+        if deferred:
+            raise ValueError(f"Cannot recompute scores with deferred mark fields: {', '.join(sorted(deferred))}")
+        changed = []
+        for col, src in SCORE_SOURCES.items():
+            value = getattr(type(self), src).func(self)
+            if self.__dict__.get(col) != value:
+                setattr(self, col, value)
+                changed.append(col)
+        return changed
 
-    # --- Final Sheet Totals ---
-    @property
-    def avg_evaluation_40(self):
-        """(Review 1 Cons + Review 2 Cons) / 2."""
-        return (self.r1_consolidated_40 + self.r2_consolidated_40) / 2.0
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or not MARK_FIELDS.isdisjoint(update_fields):
+            if self._state.adding or self._mark_snapshot() != getattr(self, '_loaded_marks', None):
+                _load_deferred_marks([self])
+                changed = self.refresh_scores()
+                if update_fields is not None:
+                    kwargs['update_fields'] = set(update_fields) | set(changed)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'updated_at'}
+        super().save(*args, **kwargs)
+        self._loaded_marks = self._mark_snapshot()
 
-    @property
-    def consolidated_report_marks(self):
-        """(Guide + Coord + HOD) / 3 for Report section."""
-        return (self.report_guide + self.report_coord + self.report_hod) / 3.0
+    # ==========================================================
+    # CALCULATION PROPERTIES
+    # ==========================================================
 
-    @property
-    def s2_total(self):
-        """Sum of Evaluation Sheet 2 (out of 15)."""
-        return (self.s2_teamwork or 0.0) + (self.s2_tech_know or 0.0) + (self.s2_regularity or 0.0)
+    # Compiled from settings.EVALX_RUBRIC (see rubric.py); a with_totals()
+    # annotation of the same name takes precedence.
+    r1_coord_total = annotated_property(rubric_scorer('r1_coord_total'))
+    r1_hod_total = annotated_property(rubric_scorer('r1_hod_total'))
+    r1_guide_total = annotated_property(rubric_scorer('r1_guide_total'))
+    # Weighted average of Coordinator, HOD, and Guide for Review 1
+    r1_consolidated_40 = annotated_property(rubric_scorer('r1_consolidated_40'))
 
-    @property
-    def final_internal_75(self):
-        """
-        Total Internal Marks Calculation:
-        Sheet 2 (15) + Cons. Report (10) + Avg Eval (40) + Attendance (10) = 75
-        """
-        return (
-            self.s2_total + 
-            self.consolidated_report_marks + 
-            self.avg_evaluation_40 + 
-            self.attendance_marks
-        )
+    r2_coord_total = annotated_property(rubric_scorer('r2_coord_total'))
+    r2_hod_total = annotated_property(rubric_scorer('r2_hod_total'))
+    r2_guide_total = annotated_property(rubric_scorer('r2_guide_total'))
+    r2_consolidated_40 = annotated_property(rubric_scorer('r2_consolidated_40'))
 
+    # --- Final Sheet Totals ---
+    # (Review 1 Cons + Review 2 Cons) / 2 with the default weights
+    avg_evaluation_40 = annotated_property(rubric_scorer('avg_evaluation_40'))
+    # (Guide + Coord + HOD) / 3 for the Report section
+    consolidated_report_marks = annotated_property(rubric_scorer('consolidated_report_marks'))
+    # Sheet 2 total from the raw fields rather than the s2_total column
+    s2_total_live = annotated_property(rubric_scorer('s2_total_live'))
+    attendance_total = annotated_property(rubric_scorer('attendance_total'))
+    # Sheet 2 (15) + Cons. Report (10) + Avg Eval (40) + Attendance (10) = 75
+    # with the default scheme
+    final_internal_75 = annotated_property(rubric_scorer('final_internal_75'))
 
     def __str__(self):
         return f"{self.name} ({self.reg_number})"
@@ -214,12 +469,38 @@ class DocumentSlot(models.Model):
     def __str__(self):
         return self.title
 
+class SubmissionBlob(models.Model):
+    """
+    One stored file, named by the SHA-256 of its content (see blobs.py).
+    ref_count is the number of TeamSubmissions pointing at it.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(upload_to='submissions/blobs/', max_length=255)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
 class TeamSubmission(models.Model):
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='submissions')
     slot = models.ForeignKey(DocumentSlot, on_delete=models.CASCADE)
-    file = models.FileField(upload_to='submissions/')
+    # file is the blob's file (older uploads may still have their own copy)
+    file = models.FileField(upload_to='submissions/', max_length=255)
+    blob = models.ForeignKey(SubmissionBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='submissions')
+    original_name = models.CharField(max_length=255, blank=True)
+    # Computed while the upload streams in (see uploads.py)
+    sha256 = models.CharField(max_length=64, blank=True)
+    size = models.BigIntegerField(null=True, blank=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(max_length=20, blank=True)
+    status = models.CharField(max_length=20, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Latest upload per team/slot and the dashboard's missing-slot filter
+            models.Index(fields=['team', 'slot', '-submitted_at'], name='submission_team_slot_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.status:
@@ -231,4 +512,112 @@ class TeamSubmission(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.team.team_id} - {self.slot.title}"
\ No newline at end of file
+        return f"{self.team.team_id} - {self.slot.title}"
+
+@receiver(post_delete, sender=TeamSubmission)
+def _release_blob(sender, instance, **kwargs):
+    # Also runs for cascades (team or slot deleted); the file itself is
+    # removed by gc_submission_blobs once nothing refers to it
+    if instance.blob_id:
+        SubmissionBlob.objects.filter(pk=instance.blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+
+class UploadSession(models.Model):
+    """
+    A resumable upload in progress (see resumable.py). received is the
+    number of bytes stored so far, i.e. the offset of the next chunk.
+    """
+    STATUS_CHOICES = (
+        ('ACTIVE', 'Active'),
+        ('COMPLETE', 'Complete'),
+        ('EXPIRED', 'Expired'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='upload_sessions')
+    slot = models.ForeignKey(DocumentSlot, on_delete=models.CASCADE)
+    file_name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)  # expected, when the client sends it
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ACTIVE')
+    started_at = models.DateTimeField(auto_now_add=True)
+    # The deadline is judged against this, not the time of the last chunk
+    first_chunk_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField()
+    submission = models.ForeignKey(TeamSubmission, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='upload_session_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.received}/{self.size})"
+
+@deconstructible
+class ReportJobStorage(FileSystemStorage):
+    """settings.REPORT_JOB_DIR, read on use; files have no public URL."""
+
+    @property
+    def base_location(self):
+        return settings.REPORT_JOB_DIR
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    def url(self, name):
+        raise ValueError("Report files are only served by report_job_download.")
+
+
+class ReportJob(models.Model):
+    """A PDF report queued for the background worker (see report_jobs.py)."""
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    report = models.CharField(max_length=30)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING', db_index=True)
+    file = models.FileField(upload_to='reports/', storage=ReportJobStorage(), blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='report_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.report} ({self.status})"
+
+
+class OutboundEmail(models.Model):
+    """One queued email to one recipient (see outbox.py)."""
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    )
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.UUIDField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's "due now" scan
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient} ({self.status})"
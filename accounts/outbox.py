@@ -0,0 +1,138 @@
+"""
+Email notification outbox.
+
+Views queue notifications as OutboundEmail rows, one per recipient, instead
+of talking to the SMTP server inside the request (and instead of putting
+every student address in one recipient list). The send_outbox management
+command drains the table:
+
+* rows are claimed in batches with a conditional UPDATE carrying a claim
+  token, so several workers never send the same message;
+* each batch goes over one open backend connection, reused across batches
+  and reopened only after a connection error;
+* sending is rate-limited to a number of messages per second;
+* a failed message is retried with exponential backoff and marked FAILED
+  after MAX_ATTEMPTS.
+"""
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=6)
+# SENDING rows older than this belong to a worker that died
+STALE_AFTER = timedelta(minutes=15)
+
+
+def queue_email(subject, body, recipients, from_email=None):
+    """Queues one message per recipient (duplicates and blanks dropped). Returns the count."""
+    recipients = list(dict.fromkeys(r for r in recipients if r))
+    OutboundEmail.objects.bulk_create([
+        OutboundEmail(subject=subject, body=body, from_email=from_email or '', recipient=r)
+        for r in recipients
+    ], batch_size=500)
+    return len(recipients)
+
+
+def backoff(attempts):
+    """Delay before retry number attempts (1 minute, doubling, capped)."""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def requeue_stale():
+    """Puts back messages left SENDING by a worker that died."""
+    return OutboundEmail.objects.filter(
+        status='SENDING', claimed_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status='PENDING', claim_token=None, claimed_at=None)
+
+
+def claim_batch(size):
+    """Atomically moves up to size due messages to SENDING and returns them."""
+    now = timezone.now()
+    due = (
+        OutboundEmail.objects.filter(status='PENDING', next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'pk').values_list('pk', flat=True)[:size]
+    )
+    token = uuid.uuid4()
+    # Rows another worker claimed in between are skipped by the status check
+    OutboundEmail.objects.filter(pk__in=list(due), status='PENDING').update(
+        status='SENDING', claim_token=token, claimed_at=now)
+    return list(OutboundEmail.objects.filter(claim_token=token, status='SENDING').order_by('pk'))
+
+
+def _failed(message, error):
+    attempts = message.attempts + 1
+    if attempts >= MAX_ATTEMPTS:
+        changes = {'status': 'FAILED'}
+    else:
+        changes = {'status': 'PENDING', 'next_attempt_at': timezone.now() + backoff(attempts)}
+    OutboundEmail.objects.filter(pk=message.pk).update(
+        attempts=F('attempts') + 1, last_error=str(error) or repr(error),
+        claim_token=None, claimed_at=None, **changes)
+
+
+def send_batch(messages, connection):
+    """
+    Sends messages one by one over connection, kept open between them.
+    Each message is marked SENT as soon as the server accepted it, so a
+    worker killed mid-batch leaves only unsent messages to be requeued.
+    Returns (sent, failed).
+    """
+    sent, failed = 0, 0
+    for message in messages:
+        email = EmailMessage(
+            subject=message.subject, body=message.body,
+            from_email=message.from_email or None, to=[message.recipient],
+            connection=connection,
+        )
+        try:
+            connection.open()  # no-op while the connection is already open
+            email.send(fail_silently=False)
+        except Exception as e:
+            _failed(message, e)
+            failed += 1
+            # The connection may be broken; the next message opens a fresh one
+            connection.close()
+        else:
+            OutboundEmail.objects.filter(pk=message.pk).update(
+                status='SENT', sent_at=timezone.now(), claim_token=None, last_error='')
+            sent += 1
+    return sent, failed
+
+
+def run_outbox(batch_size=50, rate=None, once=False, poll_interval=5.0, log=None):
+    """
+    Sends queued messages until interrupted, at most rate per second (None
+    for no limit). With once=True it returns as soon as nothing is due.
+    Returns the number of messages sent.
+    """
+    requeue_stale()
+    total = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch:
+                if once:
+                    return total
+                connection.close()  # don't hold the SMTP session while idle
+                time.sleep(poll_interval)
+                requeue_stale()
+                continue
+            started = time.monotonic()
+            sent, failed = send_batch(batch, connection)
+            total += sent
+            if log:
+                log(f"sent {sent}, failed {failed}")
+            if rate:
+                # Keep the average at or below rate messages per second
+                time.sleep(max(0.0, len(batch) / rate - (time.monotonic() - started)))
+    finally:
+        connection.close()
@@ -0,0 +1,141 @@
+"""
+Content-addressed cache for rendered reports.
+
+A report's cache key is a hash of the report name, its query parameters and
+a data-version fingerprint of the TeamMember and Team tables and the guide
+accounts. Any change to marks, teams or guides changes the fingerprint, so
+stale entries are never served; they simply age out of the LRU. The key
+doubles as the response ETag.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.http import FileResponse, HttpResponseNotModified
+
+from .models import Team, TeamMember, User
+from .rubric import get_rubric
+
+
+def data_version():
+    """
+    Fingerprint of everything the reports read. Row counts and id sums catch
+    inserts and deletes; the latest updated_at catches edits (queryset
+    update() bumps it too), and the rubric fingerprint a change of marking
+    scheme. Guides have no timestamp, but there are few of them, so the
+    fields the reports print are hashed directly.
+    """
+    members = TeamMember.objects.aggregate(n=Count('pk'), ids=Sum('pk'), latest=Max('updated_at'))
+    teams = Team.objects.aggregate(n=Count('pk'), latest=Max('updated_at'))
+    guides = User.objects.filter(role='GUIDE').order_by('pk').values_list(
+        'pk', 'email', 'username', 'first_name', 'last_name')
+    guides = hashlib.sha256(repr(list(guides)).encode()).hexdigest()[:16]
+    return '|'.join(str(v) for v in (
+        members['n'], members['ids'], members['latest'], teams['n'], teams['latest'], guides,
+        get_rubric().fingerprint,
+    ))
+
+
+def cache_key(report, params, version=None):
+    params = {k: v for k, v in sorted(params.items()) if k != 'async'}
+    raw = json.dumps([report, params, version or data_version()], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _cache_dir():
+    path = settings.REPORT_CACHE_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _paths(key):
+    base = os.path.join(_cache_dir(), key)
+    return base + '.bin', base + '.json'
+
+
+def evict(max_bytes=None):
+    """Removes least recently used entries until the cache fits in max_bytes."""
+    max_bytes = settings.REPORT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries, total = [], 0
+    with os.scandir(_cache_dir()) as it:
+        for entry in it:
+            if entry.name.endswith('.bin'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        for p in (path, path[:-4] + '.json'):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+        total -= size
+
+
+def _serve_cached(key, body_path, meta_path):
+    with open(meta_path) as f:
+        meta = json.load(f)
+    os.utime(body_path)  # mark as recently used
+    response = FileResponse(open(body_path, 'rb'), content_type=meta['content_type'])
+    if meta.get('disposition'):
+        response['Content-Disposition'] = meta['disposition']
+    response['ETag'] = f'"{key}"'
+    return response
+
+
+def _store(key, response, chunks):
+    """Writes the body to a temp file and moves it into place once complete."""
+    body_path, meta_path = _paths(key)
+    fd, tmp = tempfile.mkstemp(dir=_cache_dir(), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        with open(meta_path, 'w') as f:
+            json.dump({'content_type': response['Content-Type'], 'disposition': response.get('Content-Disposition')}, f)
+        os.replace(tmp, body_path)
+        evict()
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _etag_matches(header, key):
+    tags = [t.strip().removeprefix('W/').strip('"') for t in header.split(',')]
+    return key in tags or '*' in tags
+
+
+def cached_report(request, report, params, build_response):
+    """
+    Serves a report from the cache, or builds it with build_response() and
+    caches the body while it is sent. Honours If-None-Match.
+    """
+    if not settings.REPORT_CACHE_ENABLED:
+        return build_response()
+
+    key = cache_key(report, params)
+    if _etag_matches(request.headers.get('If-None-Match', ''), key):
+        response = HttpResponseNotModified()
+        response['ETag'] = f'"{key}"'
+        return response
+
+    body_path, meta_path = _paths(key)
+    if os.path.exists(body_path) and os.path.exists(meta_path):
+        return _serve_cached(key, body_path, meta_path)
+
+    response = build_response()
+    if response.status_code != 200:
+        return response
+    if response.streaming:
+        response.streaming_content = _store(key, response, response.streaming_content)
+    else:
+        for _ in _store(key, response, [response.content]):
+            pass
+    response['ETag'] = f'"{key}"'
+    return response
@@ -0,0 +1,187 @@
+"""
+Background PDF generation.
+
+Heavy PDF reports can be queued as ReportJob rows instead of being rendered
+inside the request. The queue is just the database table (no external
+broker): the run_report_worker management command claims pending jobs with a
+conditional UPDATE, renders their slices in a process pool, and stores the
+merged file under REPORT_JOB_DIR (private; served only by
+report_job_download). Finished jobs are purged after REPORT_JOB_KEEP_DAYS.
+"""
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .models import ReportJob
+from .reports import REPORTS, chunk_jobs, merge_pdf_chunks, render_chunk
+
+STALE_AFTER = timedelta(minutes=30)
+# How often a running worker purges expired jobs
+PURGE_EVERY = 3600.0
+
+
+def enqueue_report(key, params, user=None):
+    """Queues a PDF report, reusing an identical job that has not started yet."""
+    params = {k: v for k, v in params.items() if k not in ('async', 'format')}
+    for job in ReportJob.objects.filter(report=key, status='PENDING'):
+        if job.params == params:
+            return job
+    return ReportJob.objects.create(report=key, params=params, requested_by=user)
+
+
+def claim_next_job():
+    """Atomically moves the oldest pending job to RUNNING and returns it."""
+    candidates = ReportJob.objects.filter(status='PENDING').order_by('created_at').values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        # Only one worker can win the PENDING -> RUNNING transition
+        if ReportJob.objects.filter(pk=job_id, status='PENDING').update(status='RUNNING', started_at=timezone.now()):
+            return ReportJob.objects.get(pk=job_id)
+    return None
+
+
+def requeue_stale_jobs():
+    """Puts back jobs left RUNNING by a worker that died."""
+    return ReportJob.objects.filter(
+        status='RUNNING', started_at__lt=timezone.now() - STALE_AFTER
+    ).update(status='PENDING', started_at=None)
+
+
+def purge_finished_jobs():
+    """Deletes DONE/FAILED jobs older than REPORT_JOB_KEEP_DAYS, with their files."""
+    expired = list(ReportJob.objects.filter(
+        status__in=('DONE', 'FAILED'),
+        finished_at__lt=timezone.now() - timedelta(days=settings.REPORT_JOB_KEEP_DAYS),
+    ))
+    for job in expired:
+        if job.file:
+            job.file.delete(save=False)
+    ReportJob.objects.filter(pk__in=[job.pk for job in expired]).delete()
+    return len(expired)
+
+
+CRASHED = "The process rendering this report crashed. Please request it again."
+
+
+def _error(exc):
+    if isinstance(exc, BrokenProcessPool):
+        return CRASHED
+    return str(exc) or repr(exc)
+
+
+def _fail(job_id, error):
+    ReportJob.objects.filter(pk=job_id).update(status='FAILED', error=error, finished_at=timezone.now())
+
+
+def store_job_pdf(job, chunks):
+    """Merges the rendered slices and stores the PDF under REPORT_JOB_DIR."""
+    pdf = merge_pdf_chunks(chunks)
+    job.file.save(f"{REPORTS[job.report].filename}_{job.pk.hex[:8]}.pdf", ContentFile(pdf), save=False)
+    ReportJob.objects.filter(pk=job.pk).update(status='DONE', file=job.file.name, finished_at=timezone.now())
+
+
+def _new_pool(workers):
+    # 'spawn' gives every pool process its own fresh DB connection. The
+    # initializer must not live in a module that imports models.
+    context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup)
+
+
+def run_worker(workers=2, once=False, poll_interval=2.0, log=None):
+    """
+    Claims and renders jobs until interrupted. With once=True it returns as
+    soon as the queue is empty.
+
+    Each job is split into PDF_CHUNK_SIZE-row slices (reports.chunk_jobs)
+    that are rendered in parallel across the pool, so a single large report
+    uses every worker; this process merges the slices when the last one is
+    in. A pool process that dies (segfault, OOM kill) breaks the whole pool:
+    the jobs it was rendering are marked FAILED, a job that could not be
+    submitted goes back to PENDING, and a fresh pool takes over.
+    """
+    requeue_stale_jobs()
+    purge_finished_jobs()
+    purged_at = time.monotonic()
+    pool = _new_pool(workers)
+    running = {}  # future -> (job id, slice index)
+    jobs = {}     # job id -> (job, rendered slices)
+
+    def forget(job_id):
+        for future, (owner, _) in list(running.items()):
+            if owner == job_id:
+                future.cancel()
+                del running[future]
+        jobs.pop(job_id, None)
+
+    def replace_pool():
+        pool.shutdown(wait=False, cancel_futures=True)
+        if log:
+            log("A pool process died; started a new pool.")
+        return _new_pool(workers)
+
+    try:
+        while True:
+            while len(running) < workers:
+                job = claim_next_job()
+                if job is None:
+                    break
+                try:
+                    slices = chunk_jobs(job.report, job.params)
+                except Exception as e:
+                    _fail(job.pk, _error(e))
+                    continue
+                jobs[job.pk] = (job, [None] * len(slices))
+                try:
+                    for index, args in enumerate(slices):
+                        running[pool.submit(render_chunk, *args)] = (job.pk, index)
+                except BrokenProcessPool:
+                    forget(job.pk)
+                    ReportJob.objects.filter(pk=job.pk).update(status='PENDING', started_at=None)
+                    pool = replace_pool()
+            if not running:
+                if once:
+                    return
+                if time.monotonic() - purged_at > PURGE_EVERY:
+                    purge_finished_jobs()
+                    purged_at = time.monotonic()
+                time.sleep(poll_interval)
+                continue
+
+            done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                if future not in running:
+                    continue  # its job already failed
+                job_id, index = running.pop(future)
+                error = future.exception()
+                broken = broken or isinstance(error, BrokenProcessPool)
+                if error is not None:
+                    forget(job_id)
+                    _fail(job_id, _error(error))
+                    status = 'FAILED'
+                else:
+                    job, parts = jobs[job_id]
+                    parts[index] = future.result()
+                    if any(part is None for part in parts):
+                        continue
+                    del jobs[job_id]
+                    try:
+                        store_job_pdf(job, parts)
+                        status = 'DONE'
+                    except Exception as e:
+                        _fail(job_id, _error(e))
+                        status = 'FAILED'
+                if log:
+                    log(f"{job_id}: {status}")
+            if broken:
+                # The other futures of the dead pool fail too and are
+                # collected (as FAILED) by the next wait()
+                pool = replace_pool()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,252 @@
+"""
+Definitions of the consolidated reports.
+
+Every export format (Excel, CSV, Parquet) is built from the lists of
+(header, accessor) pairs below. An accessor is either an attribute name,
+which can be read straight from the database with values_list(), or a
+callable that receives the model instance.
+
+REPORTS ties each report's columns to its queryset and PDF template, so the
+same report can be produced inside a request or by the background worker
+(see report_jobs.py).
+"""
+import io
+import os
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+from pypdf import PdfReader, PdfWriter
+from reportlab.pdfgen import canvas
+from xhtml2pdf import pisa
+
+from .cohort import Cohort, np
+from .models import Team, TeamMember
+from .rubric import get_rubric
+
+
+def _members_summary(team):
+    return ", ".join([f"{m.name} ({m.reg_number})" for m in team.members.all()])
+
+
+R1_CONSOLIDATED_COLUMNS = [
+    ('Reg No', 'reg_number'),
+    ('Name', 'name'),
+    ('Guide', 'r1_guide_total'),
+    ('HOD', 'r1_hod_total'),
+    ('Coord', 'r1_coord_total'),
+    ('Total (40)', 'r1_consolidated_40'),
+]
+
+R2_CONSOLIDATED_COLUMNS = [
+    ('Reg No', 'reg_number'),
+    ('Name', 'name'),
+    ('Guide', 'r2_guide_total'),
+    ('HOD', 'r2_hod_total'),
+    ('Coord', 'r2_coord_total'),
+    ('Total (40)', 'r2_consolidated_40'),
+]
+
+AVG_EVALUATION_COLUMNS = [
+    ('Reg No', 'reg_number'),
+    ('Name', 'name'),
+    ('R1 Cons', 'r1_consolidated_40'),
+    ('R2 Cons', 'r2_consolidated_40'),
+    ('Avg (40)', 'avg_evaluation_40'),
+]
+
+REPORT_MARKS_COLUMNS = [
+    ('Reg No', 'reg_number'),
+    ('Name', 'name'),
+    ('Guide', 'report_guide'),
+    ('HOD', 'report_hod'),
+    ('Coord', 'report_coord'),
+    ('Consolidated (10)', 'consolidated_report_marks'),
+]
+
+FINAL_INTERNAL_COLUMNS = [
+    ('Reg No', 'reg_number'),
+    ('Name', 'name'),
+    ('Avg Eval', 'avg_evaluation_40'),
+    ('Sheet 2', 's2_total_live'),
+    ('Report', 'consolidated_report_marks'),
+    ('Attend', 'attendance_marks'),
+    ('Final (75)', 'final_internal_75'),
+]
+
+TEAM_MASTER_COLUMNS = [
+    ('Team ID', 'team_id'),
+    ('Project Title', lambda t: t.project_title or "Not Set"),
+    ('Guide', lambda t: str(t.guide)),
+    ('Members Details', _members_summary),
+]
+
+
+# ==========================================================
+# REPORT REGISTRY
+# ==========================================================
+
+def _members(projection):
+    # Totals are SQL annotations, so each report only loads the raw
+    # columns its template prints (see PROJECTIONS in models.py)
+    def build(params):
+        return TeamMember.objects.projection(projection).with_totals().order_by('reg_number')
+    return build
+
+
+def _final_internal_members(params):
+    members = _members('final')(params)
+    # Optional filters served from the indexed final_internal column,
+    # e.g. ?below=30 for students under 30/75, ?order=rank for a merit list
+    if params.get('below'):
+        try:
+            members = members.filter(final_internal__lt=float(params['below']))
+        except ValueError:
+            pass
+    if params.get('order') == 'rank':
+        members = members.order_by('-final_internal', 'reg_number')
+    return members
+
+
+def _master_teams(params):
+    members = Prefetch('members', queryset=TeamMember.objects.identity().order_by('reg_number'))
+    return Team.objects.all().prefetch_related(members).select_related('guide').order_by('team_id')
+
+
+class ReportSpec:
+    def __init__(self, title, filename, sheet_name, template, columns, queryset, context_name='members',
+                 vectorized=True):
+        self.title = title
+        self.filename = filename
+        self.sheet_name = sheet_name
+        self.template = template
+        self.columns = columns
+        self.queryset = queryset          # callable(params) -> QuerySet
+        self.context_name = context_name
+        self.vectorized = vectorized      # member report that a Cohort can score
+
+    def source(self, queryset):
+        """
+        What the PDF builders read: a NumPy Cohort for the member reports (no
+        model instances), or the queryset itself. The data exports stream the
+        queryset instead, since a Cohort holds every row in memory.
+        """
+        if self.vectorized and np is not None:
+            return Cohort.from_queryset(queryset)
+        return queryset
+
+    def context(self, queryset):
+        rows = self.source(queryset)
+        if isinstance(rows, Cohort):
+            rows = rows.records([accessor for _, accessor in self.columns])
+        return {self.context_name: rows, 'title': self.title, 'offset': 0, 'is_last_chunk': True,
+                'maxima': get_rubric().maxima}
+
+
+REPORTS = {
+    'r1_consolidated': ReportSpec(
+        'REVIEW 1 CONSOLIDATED', 'R1_Consolidated', 'Review 1',
+        'accounts/pdf_r1_cons.html', R1_CONSOLIDATED_COLUMNS, _members('identity'),
+    ),
+    'r2_consolidated': ReportSpec(
+        'REVIEW 2 CONSOLIDATED', 'R2_Consolidated', 'Review 2',
+        'accounts/pdf_r2_cons.html', R2_CONSOLIDATED_COLUMNS, _members('identity'),
+    ),
+    'avg_evaluation': ReportSpec(
+        'AVERAGE EVALUATION (40)', 'Avg_Evaluation', 'Average Eval',
+        'accounts/pdf_avg_eval_cons.html', AVG_EVALUATION_COLUMNS, _members('identity'),
+    ),
+    'report_marks': ReportSpec(
+        'REPORT MARKS CONSOLIDATED', 'Report_Marks', 'Report Marks',
+        'accounts/pdf_report_cons.html', REPORT_MARKS_COLUMNS, _members('report'),
+    ),
+    'final_internal': ReportSpec(
+        'FINAL INTERNAL MARKS (75)', 'Final_Internal_75', 'Final Internal',
+        'accounts/pdf_final_internal.html', FINAL_INTERNAL_COLUMNS, _final_internal_members,
+    ),
+    'team_master': ReportSpec(
+        'OFFICIAL TEAM MASTER RECORD', 'Team_Master_Sheet', 'Teams',
+        'accounts/pdf_master_sheet.html', TEAM_MASTER_COLUMNS, _master_teams, context_name='teams',
+        vectorized=False,
+    ),
+}
+
+
+# ==========================================================
+# PDF RENDERING
+# ==========================================================
+
+def render_branded_pdf(template_src, context_dict):
+    """Renders a report template with the institution banner and returns the PDF bytes."""
+    context_dict['logo_path'] = os.path.join(settings.BASE_DIR, 'static', 'assets', 'branding', 'logo.png')
+    html = render_to_string(template_src, context_dict)
+    output = io.BytesIO()
+    pisa.CreatePDF(html, dest=output)
+    return output.getvalue()
+
+
+def chunk_jobs(key, params):
+    """
+    Splits a report into PDF_CHUNK_SIZE-row slices: one tuple of
+    render_chunk() arguments per slice (at least one, for an empty report).
+    """
+    spec = REPORTS[key]
+    pks = list(spec.queryset(params).values_list('pk', flat=True))
+    size = settings.PDF_CHUNK_SIZE
+    slices = [pks[i:i + size] for i in range(0, len(pks), size)] or [[]]
+    return [
+        (key, params, chunk, i * size, i == 0, i == len(slices) - 1)
+        for i, chunk in enumerate(slices)
+    ]
+
+
+def render_chunk(key, params, pks, offset, is_first, is_last):
+    """Renders one slice of a report; the report worker runs these in its pool."""
+    spec = REPORTS[key]
+    queryset = spec.queryset(params).filter(pk__in=pks)
+    context = spec.context(queryset)
+    context.update({'offset': offset, 'continuation': not is_first, 'is_last_chunk': is_last})
+    return render_branded_pdf(spec.template, context)
+
+
+def _page_number_overlay(pages):
+    """One reportlab page per PDF page, carrying just its 'Page x of n' footer."""
+    buffer = io.BytesIO()
+    overlay = canvas.Canvas(buffer)
+    total = len(pages)
+    for number, page in enumerate(pages, 1):
+        width, height = float(page.mediabox.width), float(page.mediabox.height)
+        overlay.setPageSize((width, height))
+        overlay.setFont('Helvetica', 8)
+        overlay.drawCentredString(width / 2, 18, f"Page {number} of {total}")
+        overlay.showPage()
+    overlay.save()
+    buffer.seek(0)
+    return PdfReader(buffer).pages
+
+
+def merge_pdf_chunks(chunks):
+    """Concatenates rendered chunks and stamps continuous page numbers."""
+    writer = PdfWriter()
+    for chunk in chunks:
+        writer.append(PdfReader(io.BytesIO(chunk)))
+    for page, footer in zip(writer.pages, _page_number_overlay(writer.pages)):
+        page.merge_page(footer)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def render_report_pdf(key, params):
+    """
+    Renders a report to PDF in this process. The table is still rendered in
+    PDF_CHUNK_SIZE-row slices (xhtml2pdf layout cost grows faster than
+    linearly with table size) and merged with continuous page numbering;
+    only the first slice carries the banner and title.
+
+    The slices are rendered one after another here. Parallel rendering
+    belongs to the report worker (report_jobs.run_worker), which spreads the
+    slices of queued (?async=1) reports over its process pool, so web
+    processes never start pools of their own.
+    """
+    return merge_pdf_chunks([render_chunk(*job) for job in chunk_jobs(key, params)])
@@ -0,0 +1,244 @@
+"""
+Resumable uploads.
+
+A large submission can be sent as a series of chunks that survive network
+failures, in the spirit of the tus protocol:
+
+    POST   /upload/<slot_id>/sessions/   file_name, size[, sha256]
+           -> 201 {id, url, offset, chunk_size}  (an unfinished session for
+              the same file, i.e. the same sha256, is returned instead of
+              a new one)
+    HEAD   <url>                         -> Upload-Offset: bytes stored so far
+    PATCH  <url>  Upload-Offset: <n>, Upload-Checksum: sha256 <hex>, body
+           -> 200 {offset, ...}; 409 with the server's offset when the
+              client is out of step; 400 when the chunk's checksum fails
+              (the chunk is dropped, the session is kept)
+    DELETE <url>                         -> abandons the session
+
+Each chunk is spooled to a temporary file and verified, then appended to a
+part file in the submissions storage under a short row lock.
+When the last byte arrives the file is hashed, checked against the
+expected SHA-256 if one was given, and handed to the blob store. Whether
+the submission is "On Time" or "Late" is decided by when the first chunk
+arrived, so a slow connection near the deadline is not penalised. A
+session opened before the deadline expires DEADLINE_GRACE after it, so
+an early session cannot be used to send the file a day late; other
+unfinished sessions expire after SESSION_TTL (gc_submission_blobs).
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .blobs import store_blob
+from .models import TeamSubmission, UploadSession
+from .uploads import SIGNATURES, too_large_message, upload_limits
+
+CHUNK_SIZE = 4 * 1024 * 1024       # advertised to clients
+MAX_CHUNK_SIZE = 16 * 1024 * 1024  # largest PATCH body accepted
+SESSION_TTL = timedelta(hours=24)
+# How long an upload that was under way at the deadline may take to finish
+DEADLINE_GRACE = timedelta(minutes=30)
+SESSION_DIR = 'submissions/.sessions'
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A rejected session or chunk; status is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _storage():
+    return TeamSubmission._meta.get_field('file').storage
+
+
+def part_path(session):
+    """The part file in the submissions storage when it is on local disk, else a temp dir."""
+    try:
+        directory = _storage().path(SESSION_DIR)
+    except NotImplementedError:
+        directory = os.path.join(tempfile.gettempdir(), 'evalx_sessions')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{session.pk.hex}.part')
+
+
+def start_session(team, slot, file_name, size, sha256=''):
+    """
+    A new (or the matching unfinished) UploadSession for this file. Only a
+    session with the same expected SHA-256 is resumed: name and size alone
+    would resume a different file (a re-export) onto the old part file.
+    """
+    limits = upload_limits(slot.slot_type)
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension not in limits.extensions:
+        raise UploadError(f"Only {', '.join(limits.extensions)} files are accepted for this slot.")
+    if size <= 0:
+        raise UploadError("The file is empty.")
+    if size > limits.max_bytes:
+        raise UploadError(too_large_message(limits), status=413)
+
+    now = timezone.now()
+    session = None
+    if sha256:
+        session = UploadSession.objects.filter(
+            team=team, slot=slot, file_name=file_name, size=size, sha256=sha256,
+            status='ACTIVE', expires_at__gt=now,
+        ).order_by('-started_at').first()
+    if session is None:
+        expires_at = now + SESSION_TTL
+        if now <= slot.deadline:
+            expires_at = min(expires_at, slot.deadline + DEADLINE_GRACE)
+        session = UploadSession.objects.create(
+            team=team, slot=slot, file_name=file_name, size=size, sha256=sha256,
+            expires_at=expires_at)
+        open(part_path(session), 'wb').close()
+    return session
+
+
+def _copy(stream, f, length, digest):
+    remaining = length
+    while remaining:
+        data = stream.read(min(READ_SIZE, remaining))
+        if not data:
+            raise UploadError("The chunk ended early.")
+        digest.update(data)
+        f.write(data)
+        remaining -= len(data)
+    return digest
+
+
+def _active_session(session_id, team, offset, lock=False):
+    sessions = UploadSession.objects.select_related('slot')
+    if lock:
+        sessions = sessions.select_for_update(of=('self',))
+    session = sessions.filter(pk=session_id, team=team).first()
+    if session is None:
+        raise UploadError("Unknown upload.", status=404)
+    if session.status != 'ACTIVE' or session.expires_at <= timezone.now():
+        raise UploadError("This upload is no longer active.", status=410)
+    if offset != session.received:
+        raise UploadError("Offset does not match the bytes received.", status=409)
+    return session
+
+
+def write_chunk(session_id, team, offset, stream, length, checksum=''):
+    """
+    Appends length bytes read from stream at offset. checksum is the
+    chunk's hex SHA-256 (optional). Returns the updated session.
+
+    The chunk is spooled to a temporary file and verified before the
+    session row is locked, so a slow client never holds the database's
+    write lock while its bytes trickle in.
+    """
+    if length <= 0 or length > MAX_CHUNK_SIZE:
+        raise UploadError(f"Chunks must be 1 to {MAX_CHUNK_SIZE} bytes.", status=413)
+    session = _active_session(session_id, team, offset)
+    if offset + length > session.size:
+        raise UploadError("The chunk goes past the declared size.", status=413)
+
+    with tempfile.TemporaryFile() as spool:
+        digest = _copy(stream, spool, length, hashlib.sha256())
+        if checksum and digest.hexdigest() != checksum.lower():
+            raise UploadError("Chunk checksum mismatch.", status=400)
+        spool.seek(0)
+        if offset == 0:
+            extension = os.path.splitext(session.file_name)[1].lower()
+            if not spool.read(16).startswith(SIGNATURES.get(extension, (b'',))):
+                raise UploadError(f"The file is not a valid {extension} document.")
+            spool.seek(0)
+
+        with transaction.atomic():
+            # The row lock serialises chunks of the same session; another
+            # request may have stored this offset while we were reading
+            session = _active_session(session_id, team, offset, lock=True)
+            with open(part_path(session), 'r+b') as f:
+                f.seek(offset)
+                shutil.copyfileobj(spool, f, READ_SIZE)
+                f.truncate()
+            session.received = offset + length
+            changes = {'received': session.received}
+            if offset == 0:
+                session.first_chunk_at = changes['first_chunk_at'] = timezone.now()
+            UploadSession.objects.filter(pk=session.pk).update(**changes)
+    if session.received == session.size:
+        _finish(session)
+    return session
+
+
+def _finish(session):
+    """Verifies the assembled file and turns it into a TeamSubmission."""
+    path = part_path(session)
+    with transaction.atomic():
+        # Only one request gets to finish a session
+        if not UploadSession.objects.select_for_update().filter(
+                pk=session.pk, status='ACTIVE', received=session.size).exists():
+            return
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+        corrupt = bool(session.sha256) and sha256 != session.sha256.lower()
+        if corrupt:
+            # Start over rather than keep a corrupt file
+            open(path, 'wb').close()
+            UploadSession.objects.filter(pk=session.pk).update(received=0, first_chunk_at=None)
+            session.received, session.first_chunk_at = 0, None
+        else:
+            slot = session.slot
+            status = "On Time" if session.first_chunk_at <= slot.deadline else "Late"
+            blob = store_blob(path, sha256, session.size, os.path.splitext(session.file_name)[1])
+            submission = TeamSubmission(
+                team_id=session.team_id, slot=slot, blob=blob, original_name=session.file_name,
+                sha256=sha256, size=session.size, status=status)
+            submission.file.name = blob.file.name
+            submission.save()
+            session.status, session.submission = 'COMPLETE', submission
+            UploadSession.objects.filter(pk=session.pk).update(status='COMPLETE', submission=submission)
+    if corrupt:
+        raise UploadError("The assembled file does not match its checksum; please upload it again.")
+
+
+def abandon(session_id, team):
+    """Ends an unfinished session and removes its part file."""
+    session = UploadSession.objects.filter(pk=session_id, team=team, status='ACTIVE').first()
+    if session is None:
+        raise UploadError("Unknown upload.", status=404)
+    UploadSession.objects.filter(pk=session.pk).update(status='EXPIRED')
+    _remove_part(session)
+
+
+def _remove_part(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def expire_sessions():
+    """Expires unfinished sessions past their TTL and deletes their part files."""
+    stale = list(UploadSession.objects.filter(status='ACTIVE', expires_at__lte=timezone.now()))
+    for session in stale:
+        _remove_part(session)
+    UploadSession.objects.filter(pk__in=[s.pk for s in stale]).update(status='EXPIRED')
+    return len(stale)
+
+
+def session_state(request, session):
+    """JSON body describing a session to the client."""
+    return {
+        'id': str(session.pk),
+        'url': request.build_absolute_uri(reverse('upload_session', args=[session.pk])),
+        'offset': session.received,
+        'size': session.size,
+        'status': session.status,
+        'chunk_size': CHUNK_SIZE,
+    }
@@ -0,0 +1,224 @@
+"""
+Marking scheme engine.
+
+settings.EVALX_RUBRIC describes the scheme: per-criterion maxima, how the
+three evaluators of a review are weighted, what an absent flag does, and
+how the final internal mark is put together. It is compiled once into
+plain Python scoring functions (the TeamMember properties) and matching SQL
+expressions (with_totals() / recompute_scores()), so the sheets, reports
+and persisted scores all share one definition.
+
+The scheme can only use the mark columns that exist on TeamMember; the
+names of the calculated marks (r1_consolidated_40, final_internal_75, ...)
+are kept for the templates and exports whatever their maxima. After
+changing the scheme run `manage.py recompute_scores`.
+"""
+import hashlib
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.signals import setting_changed
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.dispatch import receiver
+from django.utils.deconstruct import deconstructible
+
+# Column prefix of each evaluator -> name used in the calculated marks
+EVALUATOR_LABELS = {'c': 'coord', 'h': 'hod', 'g': 'guide'}
+REVIEW_CRITERIA = ('comp', 'func', 'pres', 'oral', 'know')
+ABSENT_MODES = ('zero', 'exclude')
+
+# Final mark component -> calculated mark that carries it
+FINAL_COMPONENTS = {
+    'sheet2': 's2_total_live',
+    'report': 'consolidated_report_marks',
+    'evaluation': 'avg_evaluation_40',
+    'attendance': 'attendance_total',
+}
+
+
+def _weighted(values, weights):
+    # Leaves weight-1 terms unmultiplied so the default scheme reproduces
+    # the original formulas bit for bit
+    return [v if w == 1 else v * w for v, w in zip(values, weights)]
+
+
+def _sql_sum(terms):
+    total = terms[0]
+    for term in terms[1:]:
+        total = total + term
+    return total
+
+
+def _py_weighted(sources, weights):
+    return [s if w == 1 else f'({s}) * {w!r}' for s, w in zip(sources, weights)]
+
+
+def _py_sum(sources):
+    total = sources[0]
+    for source in sources[1:]:
+        total = f'({total} + {source})'
+    return total
+
+
+class Rubric:
+    """A compiled EVALX_RUBRIC: maxima, scorers and SQL expressions."""
+
+    def __init__(self, config):
+        self.config = config
+        self.fingerprint = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+        self.maxima = {}        # mark field or calculated mark -> maximum
+        self.scorers = {}       # calculated mark -> function(member) -> float
+        self._expressions = {}  # calculated mark -> self-contained SQL expression
+        self._sources = {}      # calculated mark -> Python expression over `m`
+        try:
+            self._compile_reviews(config['reviews'])
+            self._compile_evaluation(config['review_weights'])
+            self._compile_section('s2_total_live', config['sheet2'], mean=False)
+            self._compile_section('consolidated_report_marks', config['report'], mean=True)
+            self._compile_section('attendance_total', config['attendance'], mean=False)
+            self._compile_final(config['final'])
+        except (KeyError, TypeError, ValueError) as exc:
+            raise ImproperlyConfigured(f"EVALX_RUBRIC is invalid: {exc!r}")
+        # Each calculated mark becomes one straight-line function over the
+        # raw fields, inlining its dependencies (no nested property calls)
+        for name, source in self._sources.items():
+            scorer = eval(compile(f'lambda m: {source}', f'<rubric {name}>', 'eval'))
+            scorer.__name__ = name
+            self.scorers[name] = scorer
+
+    def expressions(self):
+        """Every calculated mark as a SQL expression (a fresh dict per call)."""
+        return dict(self._expressions)
+
+    # --- compilation -----------------------------------------------------
+
+    def _compile_reviews(self, reviews):
+        for review, spec in reviews.items():
+            if review not in ('r1', 'r2'):
+                raise ValueError(f"unknown review {review!r}")
+            criteria = spec['criteria']
+            if not set(criteria) <= set(REVIEW_CRITERIA):
+                raise ValueError(f"unknown criteria in {review}: {sorted(set(criteria) - set(REVIEW_CRITERIA))}")
+            absent_mode = spec.get('absent', 'zero')
+            if absent_mode not in ABSENT_MODES:
+                raise ValueError(f"absent must be one of {ABSENT_MODES}")
+
+            names, weights, absent_fields = [], [], []
+            for prefix, weight in spec['evaluators'].items():
+                label = EVALUATOR_LABELS[prefix]
+                fields = [f'{review}_{prefix}_{c}' for c in criteria]
+                for field, criterion in zip(fields, criteria):
+                    self.maxima[field] = float(criteria[criterion])
+                name = f'{review}_{label}_total'
+                absent_field = f'{review}_{prefix}_absent'
+                self.maxima[name] = float(sum(criteria.values()))
+                self._sources[name] = f'(0.0 if m.{absent_field} else {_py_sum([f"(m.{f} or 0)" for f in fields])})'
+                self._expressions[name] = Case(
+                    When(**{absent_field: True}, then=Value(0.0)),
+                    default=_sql_sum([F(f) for f in fields]),
+                    output_field=FloatField(),
+                )
+                names.append(name)
+                weights.append(float(weight))
+                absent_fields.append(absent_field)
+
+            name = f'{review}_consolidated_40'
+            self.maxima[name] = float(sum(criteria.values()))
+            terms = _py_sum(_py_weighted([self._sources[n] for n in names], weights))
+            if absent_mode == 'zero':
+                self._sources[name] = f'({terms} / {sum(weights)!r})'
+                self._expressions[name] = (
+                    _sql_sum(_weighted([self._expressions[n] for n in names], weights)) / Value(sum(weights))
+                )
+            else:
+                present_weight = _py_sum([f'(0.0 if m.{a} else {w!r})' for a, w in zip(absent_fields, weights)])
+                all_absent_py = ' and '.join(f'm.{a}' for a in absent_fields)
+                self._sources[name] = f'(0.0 if ({all_absent_py}) else {terms} / {present_weight})'
+                present = [Case(When(**{a: True}, then=Value(0.0)), default=Value(w), output_field=FloatField())
+                           for a, w in zip(absent_fields, weights)]
+                all_absent = Q()
+                for a in absent_fields:
+                    all_absent &= Q(**{a: True})
+                self._expressions[name] = Case(
+                    When(all_absent, then=Value(0.0)),
+                    default=_sql_sum(_weighted([self._expressions[n] for n in names], weights)) / _sql_sum(present),
+                    output_field=FloatField(),
+                )
+
+    def _compile_evaluation(self, review_weights):
+        names = [f'{review}_consolidated_40' for review in review_weights]
+        weights = [float(w) for w in review_weights.values()]
+        name = 'avg_evaluation_40'
+        self.maxima[name] = sum(self.maxima[n] * w for n, w in zip(names, weights)) / sum(weights)
+        terms = _py_sum(_py_weighted([self._sources[n] for n in names], weights))
+        self._sources[name] = f'({terms} / {sum(weights)!r})'
+        self._expressions[name] = (
+            _sql_sum(_weighted([self._expressions[n] for n in names], weights)) / Value(sum(weights))
+        )
+
+    def _compile_section(self, name, fields, mean):
+        from .models import MARK_FIELDS  # models imports this module
+        for field, maximum in fields.items():
+            # Also keeps the persisted scores honest: their snapshots only
+            # track MARK_FIELDS
+            if field not in MARK_FIELDS:
+                raise ImproperlyConfigured(f"EVALX_RUBRIC is invalid: {field!r} is not a TeamMember mark field")
+            self.maxima[field] = float(maximum)
+        total = float(sum(fields.values()))
+        self.maxima[name] = total / len(fields) if mean else total
+        count = float(len(fields))
+        if mean:
+            self._sources[name] = f"({_py_sum([f'm.{f}' for f in fields])} / {count!r})"
+        else:
+            self._sources[name] = _py_sum([f'(m.{f} or 0.0)' for f in fields])
+        expression = _sql_sum([F(f) for f in fields])
+        self._expressions[name] = expression / Value(count) if mean else expression
+
+    def _compile_final(self, final):
+        names = [FINAL_COMPONENTS[component] for component in final]
+        weights = [float(w) for w in final.values()]
+        name = 'final_internal_75'
+        self.maxima[name] = sum(self.maxima[n] * w for n, w in zip(names, weights))
+        self._sources[name] = _py_sum(_py_weighted([self._sources[n] for n in names], weights))
+        self._expressions[name] = _sql_sum(_weighted([self._expressions[n] for n in names], weights))
+
+
+@lru_cache(maxsize=1)
+def get_rubric():
+    """The compiled settings.EVALX_RUBRIC (compiled once per process)."""
+    return Rubric(settings.EVALX_RUBRIC)
+
+
+@receiver(setting_changed)
+def _reset_rubric(setting, **kwargs):
+    if setting == 'EVALX_RUBRIC':
+        get_rubric.cache_clear()
+
+
+def rubric_scorer(name):
+    """Function(member) for a calculated mark, for use with annotated_property."""
+    def score(member):
+        return get_rubric().scorers[name](member)
+    score.__name__ = name
+    return score
+
+
+@deconstructible
+class RubricMaxValidator:
+    """Caps a mark field at its current rubric maximum (no migration when it changes)."""
+
+    def __init__(self, field):
+        self.field = field
+
+    def __call__(self, value):
+        maximum = get_rubric().maxima.get(self.field)
+        if maximum is not None and value > maximum:
+            raise ValidationError(
+                "Ensure this value is less than or equal to %(limit_value)s.",
+                code='max_value', params={'limit_value': maximum},
+            )
+
+    def __eq__(self, other):
+        return isinstance(other, RubricMaxValidator) and self.field == other.field
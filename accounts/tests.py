@@ -1,3 +1,1123 @@
-from django.test import TestCase
+import copy
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.db.models import F
+from django.http import FileResponse, QueryDict
+from django.test import TestCase, override_settings
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from pypdf import PdfReader
+from reportlab.pdfgen import canvas
+
+from .allocation import next_team_id
+from .analytics import cohort_analytics
+from .outbox import run_outbox
+from . import blobs, resumable
+from .blobs import collect_garbage
+from .batch_sheets import BATCH_SHEETS, batch_page, next_cursor, parse_batch_post, save_batch_sheet
+from .cohort import Cohort
+from .exports import export_to_parquet, pq, report_rows, stream_xlsx
+from .models import (
+    SCORE_SOURCES, DocumentSlot, GuideLoad, OutboundEmail, ReportJob, SubmissionBlob, Team,
+    TeamMember, TeamSubmission, UploadSession, User,
+)
+from .report_cache import evict
+from .report_jobs import claim_next_job, enqueue_report, purge_finished_jobs, run_worker, store_job_pdf
+from .reports import REPORTS, chunk_jobs, merge_pdf_chunks, render_report_pdf
+from .resumable import DEADLINE_GRACE
+from .rubric import get_rubric
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+def make_teams(start, count, guide=None, slots=(), members_per_team=3):
+    """Bulk-creates count teams (with members and one upload per slot)."""
+    users = User.objects.bulk_create([
+        User(email=f'team{i}@example.com', username=f'team{i}', role='TEAM')
+        for i in range(start, start + count)
+    ])
+    teams = Team.objects.bulk_create([
+        Team(team_id=f'T{i:05d}', user=user, guide=guide, leader_name=f'Leader {i}')
+        for i, user in enumerate(users, start)
+    ])
+    TeamMember.objects.bulk_create([
+        TeamMember(team=team, name=f'Student {team.team_id}-{n}', reg_number=f'R{team.team_id}{n}', is_leader=n == 0)
+        for team in teams for n in range(members_per_team)
+    ])
+    TeamSubmission.objects.bulk_create([
+        TeamSubmission(team=team, slot=slot, file=f'submissions/{team.team_id}_{slot.slot_type}.pdf', status='On Time')
+        for team in teams for slot in slots
+    ])
+    return teams
+
+
+class MarkTotalsTests(TestCase):
+    TOTALS = (
+        'r1_coord_total', 'r1_hod_total', 'r1_guide_total', 'r1_consolidated_40',
+        'r2_coord_total', 'r2_hod_total', 'r2_guide_total', 'r2_consolidated_40',
+        'avg_evaluation_40', 'consolidated_report_marks', 's2_total_live',
+        'attendance_total', 'final_internal_75',
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        make_teams(0, 2)
+        TeamMember.objects.filter(reg_number__endswith='0').update(
+            r1_c_comp=8.5, r1_h_func=6, r1_g_oral=9, r1_g_absent=True, r2_c_know=7,
+            r2_h_pres=4.25, s2_regularity=3, report_hod=8, attendance_marks=9)
+
+    def test_with_totals_matches_the_properties(self):
+        for member in TeamMember.objects.with_totals():
+            plain = TeamMember.objects.get(pk=member.pk)
+            for name in self.TOTALS:
+                self.assertIn(name, member.__dict__)
+                self.assertEqual(member.__dict__[name], getattr(plain, name), msg=name)
+
+
+class PersistedScoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_teams(0, 2)
+
+    def assert_scores_current(self):
+        self.assertFalse(TeamMember.objects.score_mismatches().exists())
+        for member in TeamMember.objects.with_totals():
+            for column, source in SCORE_SOURCES.items():
+                self.assertEqual(getattr(member, column), member.__dict__[source], msg=column)
+
+    def test_save_recomputes_changed_marks(self):
+        member = TeamMember.objects.first()
+        member.r1_c_comp, member.s2_teamwork, member.attendance_marks = 9, 4, 8
+        member.save()
+        self.assertGreater(TeamMember.objects.get(pk=member.pk).final_internal, 0)
+        member.report_hod = 7
+        member.save(update_fields=['report_hod'])
+        self.assertEqual(TeamMember.objects.get(pk=member.pk).report_consolidated, 7 / 3.0)
+        self.assert_scores_current()
+
+    def test_bulk_create_and_bulk_update(self):
+        team = Team.objects.first()
+        TeamMember.objects.bulk_create([
+            TeamMember(team=team, name='New', reg_number='NEW1', r2_h_know=6, report_guide=5, attendance_marks=10),
+        ])
+        self.assert_scores_current()
+
+        members = list(TeamMember.objects.projection('review1'))
+        for member in members:
+            member.r1_g_func = 7
+        # One query fills the deferred marks for every row, one writes them
+        with self.assertNumQueries(2):
+            TeamMember.objects.bulk_update(members, ['r1_g_func'])
+        self.assert_scores_current()
+
+    def test_refresh_refuses_deferred_marks(self):
+        member = TeamMember.objects.only('id', 'r1_c_comp').first()
+        with self.assertRaises(ValueError), self.assertNumQueries(0):
+            member.refresh_scores()
+
+    def test_verify_reports_corrupted_rows(self):
+        call_command('recompute_scores', '--verify', stdout=StringIO())
+        member = TeamMember.objects.first()
+        TeamMember.objects.filter(pk=member.pk).update(final_internal=74)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('recompute_scores', '--verify', stdout=out)
+        self.assertIn(member.reg_number, out.getvalue())
+        untouched = dict(TeamMember.objects.exclude(pk=member.pk).values_list('pk', 'updated_at'))
+        out = StringIO()
+        call_command('recompute_scores', stdout=out)
+        self.assertIn('for 1 student(s)', out.getvalue())
+        self.assert_scores_current()
+        # Only the stale row is touched, so cached reports stay valid
+        self.assertEqual(dict(TeamMember.objects.exclude(pk=member.pk).values_list('pk', 'updated_at')), untouched)
+
+
+class BatchSheetSaveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_teams(0, 1)
+        cls.first, cls.second, cls.third = TeamMember.objects.order_by('reg_number')
+        TeamMember.objects.filter(pk=cls.second.pk).update(r1_c_absent=True, r1_c_know=4)
+
+    def test_one_bulk_update_for_several_rows_and_fields(self):
+        post = QueryDict(mutable=True)
+        post.update({f'comp_{self.first.pk}': '8', f'oral_{self.first.pk}': '6.5'})
+        # Checkboxes post a hidden '0' first; a ticked box adds '1'
+        post.setlist(f'absent_{self.first.pk}', ['0', '1'])
+        post.setlist(f'absent_{self.second.pk}', ['0'])
+        post[f'comp_{self.third.pk}'] = '0'  # posted but unchanged
+
+        self.assertEqual(parse_batch_post(post, BATCH_SHEETS['r1']), {
+            self.first.pk: {'r1_c_comp': 8.0, 'r1_c_oral': 6.5, 'r1_c_absent': True},
+            self.second.pk: {'r1_c_absent': False},
+            self.third.pk: {'r1_c_comp': 0.0},
+        })
+        with CaptureQueriesContext(connection) as ctx:
+            changed = save_batch_sheet(post, TeamMember.objects.review1_sheet(), BATCH_SHEETS['r1'])
+        self.assertEqual(changed, 2)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "accounts_teammember"')]
+        self.assertEqual(len(updates), 1)
+
+        first, second, third = TeamMember.objects.order_by('reg_number')
+        self.assertEqual((first.r1_c_comp, first.r1_c_oral, first.r1_c_absent), (8.0, 6.5, True))
+        self.assertEqual((second.r1_c_absent, second.r1_c_know), (False, 4.0))
+        self.assertEqual(second.r1_consolidated, 4 / 3.0)
+        self.assertEqual(third.updated_at, self.third.updated_at)
+
+    def test_posted_rows_are_locked(self):
+        members = TeamMember.objects.review1_sheet()
+        with mock.patch.object(type(members), 'select_for_update', autospec=True,
+                               side_effect=lambda qs, **kwargs: qs) as lock:
+            save_batch_sheet(QueryDict(f'comp_{self.first.pk}=5'), members, BATCH_SHEETS['r1'])
+        lock.assert_called_once()
+        self.assertEqual(TeamMember.objects.get(pk=self.first.pk).r1_c_comp, 5.0)
+
+
+class BatchSheetViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.coordinator = User.objects.create_user(
+            email='coordinator@example.com', username='coordinator', password='x', role='COORDINATOR')
+        cls.team, = make_teams(0, 1)
+
+    def test_keyset_pages(self):
+        members = TeamMember.objects.all()
+        page, filters, size = batch_page(members, QueryDict('size=2&team=T00000'))
+        page = list(page)
+        self.assertEqual((filters, size), ({'team_id': 'T00000'}, 2))
+        self.assertEqual([m.reg_number for m in page], ['RT000000', 'RT000001'])
+        self.assertEqual(next_cursor(page, size), 'RT000001')
+
+        page, _, size = batch_page(members, QueryDict('size=2&after=RT000001'))
+        self.assertEqual([m.reg_number for m in page], ['RT000002'])
+        self.assertIsNone(next_cursor(list(page), size))
+
+    def test_json_page(self):
+        self.client.force_login(self.coordinator)
+        data = self.client.get(reverse('batch_r1_coordinator'), {'format': 'json', 'size': 2}).json()
+        self.assertEqual(data['next'], 'RT000001')
+        self.assertEqual(set(data['rows'][0]), {'id', 'reg_number', 'name', 'team_id', *BATCH_SHEETS['r1'].fields})
+        self.assertEqual([row['reg_number'] for row in data['rows']], ['RT000000', 'RT000001'])
+
+    def test_only_the_coordinator(self):
+        member = TeamMember.objects.order_by('reg_number').first()
+        self.client.force_login(self.team.user)
+        response = self.client.get(reverse('batch_r1_coordinator'), {'format': 'json'})
+        self.assertEqual(response.status_code, 403)
+        self.assertRedirects(self.client.get(reverse('batch_r1_coordinator')), reverse('coordinator_login'),
+                             fetch_redirect_response=False)
+        self.client.post(reverse('batch_r1_coordinator'), {f'comp_{member.pk}': '10'})
+        member.refresh_from_db()
+        self.assertEqual(member.r1_c_comp, 0.0)
+
+
+@skipUnless(openpyxl, "openpyxl is not installed")
+class ExcelExportTests(TestCase):
+    def load(self, chunks):
+        return openpyxl.load_workbook(BytesIO(b''.join(chunks)), read_only=True)
+
+    def test_streamed_workbook_opens(self):
+        rows = [['bad\x01name', 7.5, True], ['Tab\tand <&> "quotes"', 3, False], [None, 0.1, False]]
+        workbook = self.load(stream_xlsx(['Name', 'Score', 'Absent'], iter(rows), 'Marks\x02'))
+        sheet = workbook['Marks']
+        self.assertEqual([list(r) for r in sheet.iter_rows(values_only=True)], [
+            ['Name', 'Score', 'Absent'],
+            ['badname', 7.5, True],
+            ['Tab\tand <&> "quotes"', 3, False],
+            [None, 0.1, False],
+        ])
+
+    @override_settings(REPORT_CACHE_ENABLED=False)
+    def test_report_download(self):
+        make_teams(0, 1)
+        TeamMember.objects.filter(reg_number='RT000000').update(name='Stray\x0bchar')
+        self.client.force_login(User.objects.create_user(
+            email='coordinator@example.com', username='coordinator', password='x', role='COORDINATOR'))
+        response = self.client.get(reverse('report_final_internal'), {'format': 'excel'})
+        sheet = self.load(response.streaming_content).active
+        names = [row[1] for row in sheet.iter_rows(min_row=2, values_only=True)]
+        self.assertEqual(len(names), 3)
+        self.assertIn('Straychar', names)
+
+
+@skipUnless(pq, "pyarrow is not installed")
+class ParquetExportTests(TestCase):
+    def test_written_in_row_groups_and_served_from_a_file(self):
+        rows = ([f'R{i}', i / 2] for i in range(5))
+        response = export_to_parquet(['Reg No', 'Score'], rows, 'marks', chunk_size=2)
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="marks.parquet"')
+        parquet = pq.ParquetFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        self.assertEqual(parquet.read().to_pydict(), {'Reg No': [f'R{i}' for i in range(5)], 'Score': [0.0, 0.5, 1.0, 1.5, 2.0]})
+        response.close()
+
+
+def pdf_text(pdf):
+    return '\n'.join(page.extract_text() for page in PdfReader(BytesIO(pdf)).pages)
+
+
+def simple_pdf(pages):
+    buffer = BytesIO()
+    document = canvas.Canvas(buffer)
+    for number in range(pages):
+        document.drawString(72, 720, f"Body {number}")
+        document.showPage()
+    document.save()
+    return buffer.getvalue()
+
+
+class ChunkedPdfTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_teams(0, 1, members_per_team=5)
+
+    @override_settings(PDF_CHUNK_SIZE=2)
+    def test_slices(self):
+        jobs = chunk_jobs('r1_consolidated', {})
+        pks = list(TeamMember.objects.order_by('reg_number').values_list('pk', flat=True))
+        self.assertEqual([(chunk, offset, first, last) for _, _, chunk, offset, first, last in jobs], [
+            (pks[0:2], 0, True, False),
+            (pks[2:4], 2, False, False),
+            (pks[4:5], 4, False, True),
+        ])
+        TeamMember.objects.all().delete()
+        self.assertEqual(chunk_jobs('r1_consolidated', {}), [('r1_consolidated', {}, [], 0, True, True)])
+
+    def test_merge_numbers_pages_continuously(self):
+        merged = PdfReader(BytesIO(merge_pdf_chunks([simple_pdf(2), simple_pdf(1)])))
+        self.assertEqual(len(merged.pages), 3)
+        for number, page in enumerate(merged.pages, 1):
+            self.assertIn(f"Page {number} of 3", page.extract_text())
+        self.assertIn("Body 0", merged.pages[2].extract_text())
+
+    @override_settings(PDF_CHUNK_SIZE=2)
+    def test_render_in_slices_in_process(self):
+        text = pdf_text(render_report_pdf('r1_consolidated', {}))
+        # The banner and title only head the first slice
+        self.assertEqual(text.count('REVIEW 1 CONSOLIDATED'), 1)
+        for reg_number in TeamMember.objects.values_list('reg_number', flat=True):
+            self.assertIn(reg_number, text)
+        self.assertIn('Page 1 of', text)
+
+
+class FakePool:
+    """Stands in for the worker's ProcessPoolExecutor, one scripted outcome per submit()."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        outcome = self.outcomes.pop(0)
+        if outcome == 'broken':
+            raise BrokenProcessPool("pool is broken")
+        future = Future()
+        if isinstance(outcome, Exception):
+            future.set_exception(outcome)
+        else:
+            future.set_result(fn(*args))  # 'run': render in this process
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+class ReportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.coordinator = User.objects.create_user(
+            email='coordinator@example.com', username='coordinator', password='x', role='COORDINATOR')
+        cls.team_user = User.objects.create_user(email='team@example.com', username='team', password='x', role='TEAM')
+
+    def setUp(self):
+        self.reports_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.reports_dir, ignore_errors=True)
+        override = self.settings(REPORT_JOB_DIR=self.reports_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_enqueue_reuses_an_identical_pending_job(self):
+        job = enqueue_report('final_internal', {'below': '30', 'async': '1'}, self.coordinator)
+        self.assertEqual(enqueue_report('final_internal', {'below': '30', 'format': 'pdf'}), job)
+        self.assertNotEqual(enqueue_report('final_internal', {'below': '40'}), job)
+        self.assertNotEqual(enqueue_report('team_master', {'below': '30'}), job)
+        ReportJob.objects.filter(pk=job.pk).update(status='DONE')
+        self.assertNotEqual(enqueue_report('final_internal', {'below': '30'}), job)
+
+    def test_claim_takes_the_oldest_pending_job_once(self):
+        first = enqueue_report('r1_consolidated', {})
+        second = enqueue_report('r2_consolidated', {})
+        ReportJob.objects.filter(pk=second.pk).update(created_at=first.created_at + timedelta(seconds=1))
+        claimed = claim_next_job()
+        self.assertEqual((claimed, claimed.status), (first, 'RUNNING'))
+        self.assertIsNotNone(claimed.started_at)
+        self.assertEqual(claim_next_job(), second)
+        self.assertIsNone(claim_next_job())
+
+    def test_worker_survives_a_broken_pool(self):
+        crashed = enqueue_report('r1_consolidated', {})
+        fine = enqueue_report('r2_consolidated', {})
+        ReportJob.objects.filter(pk=fine.pk).update(created_at=crashed.created_at + timedelta(seconds=1))
+        pools = [FakePool('broken'), FakePool(BrokenProcessPool("child died")), FakePool('run')]
+        with mock.patch('accounts.report_jobs._new_pool', side_effect=list(pools)):
+            run_worker(workers=1, once=True)
+        fine.refresh_from_db()
+        with fine.file.open('rb') as f:
+            self.assertEqual(f.read(5), b'%PDF-')
+        crashed.refresh_from_db()
+        self.assertEqual(crashed.status, 'FAILED')
+        self.assertIn('crashed', crashed.error)
+        self.assertEqual(fine.status, 'DONE')
+        self.assertTrue(all(pool.shut_down for pool in pools))
+
+    @override_settings(PDF_CHUNK_SIZE=2)
+    def test_worker_renders_slices_across_the_pool(self):
+        make_teams(0, 1, members_per_team=5)
+        job = enqueue_report('r1_consolidated', {})
+        pool = FakePool('run', 'run', 'run')
+        with mock.patch('accounts.report_jobs._new_pool', return_value=pool):
+            run_worker(workers=3, once=True)
+        job.refresh_from_db()
+        with job.file.open('rb') as f:
+            text = pdf_text(f.read())
+        self.assertEqual((job.status, pool.outcomes), ('DONE', []))
+        self.assertEqual(text.count('REVIEW 1 CONSOLIDATED'), 1)
+        for reg_number in TeamMember.objects.values_list('reg_number', flat=True):
+            self.assertIn(reg_number, text)
+
+    def test_job_views_check_access(self):
+        job = enqueue_report('final_internal', {}, self.coordinator)
+        status_url = reverse('report_job_status', args=[job.pk])
+        download_url = reverse('report_job_download', args=[job.pk])
+
+        self.client.force_login(self.team_user)
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+        self.assertEqual(self.client.get(download_url).status_code, 404)
+        own = enqueue_report('r1_consolidated', {}, self.team_user)
+        self.assertEqual(self.client.get(reverse('report_job_status', args=[own.pk])).json()['status'], 'PENDING')
+
+        self.client.force_login(self.coordinator)
+        self.assertEqual(self.client.get(status_url).json()['download_url'], None)
+        # Not rendered yet
+        self.assertEqual(self.client.get(download_url).status_code, 404)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(status_url).status_code, 302)
+
+    def test_files_are_private_and_purged(self):
+        job = enqueue_report('final_internal', {}, self.coordinator)
+        store_job_pdf(job, [simple_pdf(1)])
+        job.refresh_from_db()
+        self.assertTrue(os.path.realpath(job.file.path).startswith(os.path.realpath(self.reports_dir)))
+        with self.assertRaises(ValueError):
+            job.file.url
+        self.client.force_login(self.coordinator)
+        response = self.client.get(reverse('report_job_download', args=[job.pk]))
+        self.assertEqual(b''.join(response.streaming_content)[:5], b'%PDF-')
+
+        path = job.file.path
+        self.assertEqual(purge_finished_jobs(), 0)
+        ReportJob.objects.filter(pk=job.pk).update(finished_at=timezone.now() - timedelta(days=8))
+        self.assertEqual(purge_finished_jobs(), 1)
+        self.assertFalse(ReportJob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+
+class ReportCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.coordinator = User.objects.create_user(
+            email='coordinator@example.com', username='coordinator', password='x', role='COORDINATOR')
+        cls.guide = User.objects.create_user(email='guide@example.com', username='guide', password='x', role='GUIDE')
+        make_teams(0, 2, cls.guide)
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        settings_override = self.settings(REPORT_CACHE_ENABLED=True, REPORT_CACHE_DIR=cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.cache_dir = cache_dir
+        self.client.force_login(self.coordinator)
+
+    def get(self, if_none_match=None):
+        headers = {'If-None-Match': if_none_match} if if_none_match else {}
+        response = self.client.get(reverse('report_final_internal'), {'format': 'csv'}, headers=headers)
+        if response.status_code == 200:
+            b''.join(response.streaming_content)  # the body is cached as it is sent
+        return response
+
+    def test_etag_and_not_modified(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+        self.assertEqual(self.get(if_none_match=f'"stale", W/{etag}').status_code, 304)
+        cached = self.get(if_none_match='"stale"')
+        self.assertEqual((cached.status_code, cached['ETag']), (200, etag))
+        self.assertIsInstance(cached, FileResponse)
+
+    def test_changes_invalidate(self):
+        etags = {self.get()['ETag']}
+        # A queryset update() that does not mention updated_at
+        TeamMember.objects.filter(reg_number='RT000000').update(attendance_marks=5)
+        etags.add(self.get()['ETag'])
+        # Guide details live on User, which has no timestamp
+        User.objects.filter(pk=self.guide.pk).update(email='renamed@example.com')
+        etags.add(self.get()['ETag'])
+        Team.objects.filter(pk='T00001').update(project_title='New title')
+        etags.add(self.get()['ETag'])
+        self.assertEqual(len(etags), 4)
+        self.assertEqual(self.get(if_none_match=self.get()['ETag']).status_code, 304)
+
+    def test_lru_eviction(self):
+        now = time.time()
+        for age, key in enumerate(['newest', 'middle', 'oldest']):
+            path = os.path.join(self.cache_dir, key)
+            with open(path + '.bin', 'wb') as f:
+                f.write(b'x' * 100)
+            open(path + '.json', 'w').close()
+            os.utime(path + '.bin', (now - age * 60, now - age * 60))
+        evict(max_bytes=250)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['middle.bin', 'middle.json', 'newest.bin', 'newest.json'])
+        evict(max_bytes=100)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['newest.bin', 'newest.json'])
+
+
+class CoordinatorDashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.coordinator = User.objects.create_user(
+            email='coordinator@example.com', username='coordinator', password='x', role='COORDINATOR')
+        cls.guide = User.objects.create_user(
+            email='guide@example.com', username='guide', password='x', role='GUIDE')
+        now = timezone.now()
+        cls.slots = [
+            DocumentSlot.objects.create(title='Abstract', slot_type='ABSTRACT', deadline=now - timedelta(days=1)),
+            DocumentSlot.objects.create(title='SRS Document', slot_type='SRS', deadline=now + timedelta(days=7)),
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.coordinator)
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('coordinator_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_query_count_does_not_grow_with_teams(self):
+        make_teams(0, 10, self.guide, self.slots)
+        small = self.dashboard_queries()
+        make_teams(10, 990, self.guide, self.slots)
+        self.assertEqual(self.dashboard_queries(), small)
+
+    def test_latest_submission_per_slot_is_shown(self):
+        team, = make_teams(0, 1, self.guide, self.slots[:1])
+        late = TeamSubmission.objects.create(
+            team=team, slot=self.slots[0], file='submissions/resubmitted.pdf', status='Late')
+        TeamSubmission.objects.filter(pk=late.pk).update(submitted_at=timezone.now() + timedelta(minutes=5))
+
+        response = self.client.get(reverse('coordinator_dashboard'))
+        abstract, srs = response.context['teams'][0].documents
+        self.assertEqual((abstract.state, abstract.is_late), ('submitted', True))
+        self.assertEqual(abstract.url, reverse('submission_file', args=[late.pk]))
+        self.assertEqual(srs.state, 'open')
+
+    def test_keyset_pages_cover_every_team_once(self):
+        make_teams(0, 7, self.guide)
+        seen, after = [], ''
+        while True:
+            response = self.client.get(reverse('coordinator_dashboard'), {'size': 3, 'after': after})
+            seen += [team.team_id for team in response.context['teams']]
+            after = response.context['next_cursor']
+            if not after:
+                break
+        self.assertEqual(sorted(seen), sorted(Team.objects.values_list('team_id', flat=True)))
+        self.assertEqual(len(seen), 7)
+
+    def test_filters_and_search(self):
+        first, second = make_teams(0, 2, self.guide, self.slots[:1])
+        TeamSubmission.objects.filter(team=second).update(status='Late')
+        Team.objects.filter(pk=first.pk).update(is_approved=True)
+
+        def team_ids(**params):
+            response = self.client.get(reverse('coordinator_dashboard'), params)
+            return [team.team_id for team in response.context['teams']]
+
+        self.assertEqual(team_ids(approved='1'), [first.team_id])
+        self.assertEqual(team_ids(late='1'), [second.team_id])
+        self.assertEqual(team_ids(missing='SRS'), [second.team_id, first.team_id])
+        self.assertEqual(team_ids(missing='ABSTRACT'), [])
+        self.assertEqual(team_ids(q=f'R{second.team_id}1'), [second.team_id])
+        self.assertEqual(team_ids(q='student t00000'), [first.team_id])
+
+
+class TeamDashboardQueryTests(TestCase):
+    # Session + user for the login, then one query for teams (guide and
+    # user joined) and one for the prefetched members.
+    EXPECTED_QUERIES = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hod = User.objects.create_user(email='hod@example.com', username='hod', password='x', role='HOD')
+        cls.guide = User.objects.create_user(email='guide@example.com', username='guide', password='x', role='GUIDE')
+        other = User.objects.create_user(email='other@example.com', username='other', password='x', role='GUIDE')
+        make_teams(0, 20, cls.guide)
+        make_teams(20, 20, other)
+
+    def test_hod_dashboard_query_count(self):
+        self.client.force_login(self.hod)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(reverse('hod_dashboard'))
+        self.assertContains(response, 'guide@example.com')
+        self.assertEqual(len(response.context['teams']), 40)
+
+    def test_guide_dashboard_query_count(self):
+        self.client.force_login(self.guide)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(reverse('guide_dashboard'))
+        self.assertEqual(len(response.context['teams']), 20)
+
+    def test_member_mark_columns_are_not_loaded(self):
+        self.client.force_login(self.hod)
+        response = self.client.get(reverse('hod_dashboard'))
+        member = response.context['teams'][0].members.all()[0]
+        self.assertIn('r1_c_comp', member.get_deferred_fields())
+        self.assertNotIn('reg_number', member.get_deferred_fields())
+
+
+class ProjectionTests(TestCase):
+    """Templates must only read columns of their projection (a deferred read is a query per row)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        guide = User.objects.create_user(email='guide@example.com', username='guide', password='x', role='GUIDE')
+        make_teams(0, 5, guide)
+
+    def test_batch_sheets_render_from_their_projection(self):
+        for key, sheet in BATCH_SHEETS.items():
+            with self.subTest(sheet=key):
+                members = list(TeamMember.objects.projection(sheet.projection))
+                with self.assertNumQueries(0):
+                    render_to_string(sheet.template, {'members': members})
+
+    def test_reports_render_from_their_projection(self):
+        for key, spec in REPORTS.items():
+            with self.subTest(report=key):
+                # One query for the rows (Cohort or queryset), plus the member prefetch
+                with self.assertNumQueries(1 if spec.vectorized else 2):
+                    render_to_string(spec.template, spec.context(spec.queryset({})))
+
+
+class RubricTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_teams(0, 1, members_per_team=2)
+        TeamMember.objects.update(
+            r1_c_comp=8, r1_c_oral=6, r1_h_comp=9, r1_h_know=7, r1_g_absent=True,
+            r2_c_func=4, s2_teamwork=3, report_guide=9, attendance_marks=8)
+
+    def assert_python_matches_sql(self):
+        for member in TeamMember.objects.with_totals():
+            fresh = TeamMember.objects.get(pk=member.pk)
+            for name in get_rubric().scorers:
+                self.assertAlmostEqual(getattr(fresh, name), getattr(member, name), msg=name)
+
+    def test_default_scheme(self):
+        member = TeamMember.objects.first()
+        self.assertEqual(member.r1_consolidated_40, (14 + 16 + 0) / 3.0)
+        self.assertEqual(get_rubric().maxima['final_internal_75'], 75)
+        self.assert_python_matches_sql()
+
+    def test_changed_scheme_needs_no_code_change(self):
+        rubric = copy.deepcopy(settings.EVALX_RUBRIC)
+        rubric['reviews']['r1']['evaluators'] = {'c': 1, 'h': 2, 'g': 1}
+        rubric['reviews']['r1']['absent'] = 'exclude'
+        rubric['final']['evaluation'] = 0.5
+        with self.settings(EVALX_RUBRIC=rubric):
+            member = TeamMember.objects.first()
+            self.assertAlmostEqual(member.r1_consolidated_40, (14 + 2 * 16) / 3.0)
+            self.assertEqual(get_rubric().maxima['final_internal_75'], 55)
+            self.assert_python_matches_sql()
+
+    def test_exports_read_the_live_sheet2_total(self):
+        # update() leaves the persisted s2_total stale until recompute_scores
+        TeamMember.objects.update(s2_teamwork=5)
+        spec = REPORTS['final_internal']
+        headers = [header for header, _ in spec.columns]
+        rows = list(report_rows(spec.queryset({}), spec.columns))
+        self.assertEqual({row[headers.index('Sheet 2')] for row in rows}, {5.0})
+        self.assertIn('5.0', render_to_string(spec.template, spec.context(spec.queryset({}))))
+
+    def test_unknown_field(self):
+        rubric = copy.deepcopy(settings.EVALX_RUBRIC)
+        rubric['sheet2']['s2_teamwrok'] = rubric['sheet2'].pop('s2_teamwork')
+        with self.settings(EVALX_RUBRIC=rubric), self.assertRaisesMessage(ImproperlyConfigured, "'s2_teamwrok'"):
+            get_rubric()
+
+    def test_batch_sheet_rejects_marks_above_the_maximum(self):
+        member = TeamMember.objects.first()
+        with self.assertRaises(ValueError):
+            save_batch_sheet(QueryDict(f'pres_{member.pk}=6'), TeamMember.objects.all(), BATCH_SHEETS['r1'])
+        self.assertEqual(save_batch_sheet(QueryDict(f'pres_{member.pk}=5'), TeamMember.objects.all(), BATCH_SHEETS['r1']), 1)
+
+
+class CohortTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_teams(0, 3)
+        TeamMember.objects.filter(reg_number__endswith='0').update(
+            r1_c_comp=7.5, r1_h_pres=3, r1_g_absent=True, r2_g_oral=9, s2_tech_know=5,
+            report_hod=7, attendance_marks=9)
+        TeamMember.objects.recompute_scores()
+
+    def test_matches_sql_totals_exactly(self):
+        queryset = TeamMember.objects.with_totals().order_by('reg_number')
+        cohort = Cohort.from_queryset(queryset)
+        for i, member in enumerate(queryset):
+            for name in get_rubric().scorers:
+                self.assertEqual(cohort.scores[name][i], getattr(member, name), msg=name)
+
+    @override_settings(REPORT_CACHE_ENABLED=False)
+    def test_csv_export_streams_the_queryset(self):
+        self.client.force_login(User.objects.create_user(
+            email='coordinator@example.com', username='coordinator', password='x', role='COORDINATOR'))
+        with mock.patch.object(Cohort, 'from_queryset', side_effect=AssertionError("loaded the whole cohort")):
+            response = self.client.get(reverse('report_final_internal'), {'format': 'csv', 'order': 'rank'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        top = TeamMember.objects.order_by('-final_internal', 'reg_number').first()
+        self.assertTrue(lines[1].startswith(f'{top.reg_number},{top.name},'))
+        self.assertEqual(float(lines[1].split(',')[-1]), top.final_internal)
+
+
+class AnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lenient = User.objects.create_user(email='lenient@example.com', username='lenient', password='x', role='GUIDE')
+        cls.strict = User.objects.create_user(email='strict@example.com', username='strict', password='x', role='GUIDE')
+        make_teams(0, 2, cls.lenient)
+        make_teams(2, 2, cls.strict)
+        # Coordinator and HOD give 20, the lenient guide 32 and the strict one 20
+        TeamMember.objects.update(r1_c_comp=10, r1_c_oral=10, r1_h_comp=10, r1_h_oral=10, r1_g_comp=10, r1_g_oral=10)
+        TeamMember.objects.filter(team__guide=cls.lenient).update(r1_g_know=10, r1_g_func=2)
+        TeamMember.objects.filter(reg_number='RT000020').update(r1_h_comp=0, r1_h_oral=1)
+
+    def test_distributions_and_flags(self):
+        data = cohort_analytics()
+        r1 = data['reviews']['r1']
+        self.assertEqual(r1['roles']['coord']['n'], 12)
+        self.assertEqual(r1['roles']['coord']['mean'], 20.0)
+        self.assertEqual(r1['roles']['guide']['percentiles']['p90'], 32.0)
+        self.assertEqual(sum(r1['roles']['hod']['histogram']['counts']), 12)
+        self.assertEqual([g['guide'] for g in data['flagged_guides']], ['lenient@example.com'])
+        self.assertEqual(data['flagged_guides'][0]['bias'], 12.0)
+        self.assertEqual([s['reg_number'] for s in data['flagged_students']][:1], ['RT000020'])
+        # Nothing entered for review 2 yet
+        self.assertEqual(data['reviews']['r2']['roles']['hod']['n'], 0)
+
+    @override_settings(REPORT_CACHE_ENABLED=False)
+    def test_json_endpoint(self):
+        self.client.force_login(User.objects.create_user(
+            email='hod@example.com', username='hod', password='x', role='HOD'))
+        response = self.client.get(reverse('cohort_analytics'), {'format': 'json'})
+        self.assertEqual(response.json()['members'], 12)
+        self.assertContains(self.client.get(reverse('cohort_analytics')), 'lenient@example.com')
+
+    def test_without_numpy(self):
+        self.client.force_login(User.objects.create_user(
+            email='hod@example.com', username='hod', password='x', role='HOD'))
+        with mock.patch('accounts.views.np', None):
+            response = self.client.get(reverse('cohort_analytics'), {'format': 'json'})
+        self.assertEqual(response.status_code, 501)
+
+
+class GuideAllocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.guides = [
+            User.objects.create_user(email=f'guide{i}@example.com', username=f'guide{i}', password='x', role='GUIDE')
+            for i in range(2)
+        ]
+        make_teams(0, 2, cls.guides[0])
+
+    def register(self, n):
+        return self.client.post(reverse('register_team'), {
+            'email': f'new{n}@example.com', 'password': 'x', 'leader_name': 'Lead',
+            'm1_name': 'Lead', 'm1_reg': f'NEW{n}1', 'm2_name': 'Other', 'm2_reg': f'NEW{n}2',
+        })
+
+    def test_least_loaded_guide_and_counter(self):
+        for n in range(4):
+            self.register(n)
+        self.assertEqual(Team.objects.filter(guide=self.guides[0]).count(), 3)
+        self.assertEqual(Team.objects.filter(guide=self.guides[1]).count(), 3)
+        self.assertEqual(dict(GuideLoad.objects.values_list('guide', 'team_count')),
+                         {self.guides[0].pk: 3, self.guides[1].pk: 3})
+        self.assertEqual(TeamMember.objects.filter(reg_number__startswith='NEW0').count(), 2)
+
+    @override_settings(EVALX_GUIDE_CAPACITY=3)
+    def test_capacity_and_rollback(self):
+        GuideLoad.objects.bulk_create([GuideLoad(guide=self.guides[1], capacity=1)])
+        self.register(0)
+        self.register(1)
+        response = self.register(2)
+        self.assertIn('No Faculty Guides are currently available', str(list(response.context['messages'])[-1]))
+        # Nothing of the failed registration is left behind
+        self.assertFalse(User.objects.filter(email='new2@example.com').exists())
+        self.assertEqual(dict(GuideLoad.objects.values_list('guide', 'team_count')),
+                         {self.guides[0].pk: 3, self.guides[1].pk: 1})
+
+    def test_counter_follows_moves_and_deletes(self):
+        self.register(0)
+        self.register(1)
+        loads = lambda: dict(GuideLoad.objects.values_list('guide', 'team_count'))
+        self.assertEqual(loads(), {self.guides[0].pk: 2, self.guides[1].pk: 2})
+
+        team = Team.objects.get(team_id='T00000')
+        team.guide = self.guides[1]
+        team.save()
+        team.save()
+        self.assertEqual(loads(), {self.guides[0].pk: 1, self.guides[1].pk: 3})
+
+        # Cascade from the team's user, and a plain delete
+        User.objects.filter(email='new0@example.com').delete()
+        Team.objects.get(team_id='T00001').delete()
+        self.assertEqual(loads(), {self.guides[0].pk: 0, self.guides[1].pk: 2})
+
+
+class TeamIdTests(TestCase):
+    def test_numbered_per_academic_year(self):
+        may, june = timezone.make_aware(datetime(2026, 5, 31, 12)), timezone.make_aware(datetime(2026, 6, 1, 12))
+        self.assertEqual([next_team_id(may), next_team_id(may)], ['TM2500001', 'TM2500002'])
+        self.assertEqual(next_team_id(june), 'TM2600001')
+        self.assertEqual(next_team_id(may), 'TM2500003')
+
+    def test_new_counter_continues_after_existing_ids(self):
+        user = User.objects.create_user(email='t@example.com', username='t', password='x', role='TEAM')
+        Team.objects.create(team_id='TM2600041', user=user)
+        self.assertEqual(next_team_id(timezone.make_aware(datetime(2026, 9, 1, 12))), 'TM2600042')
+
+
+class BouncingBackend(EmailBackend):
+    """locmem backend that rejects addresses containing 'bounce'."""
+    def send_messages(self, messages):
+        for message in messages:
+            if any('bounce' in to for to in message.to):
+                raise OSError("mailbox unavailable")
+        return super().send_messages(messages)
+
+
+class DyingBackend(EmailBackend):
+    """locmem backend whose worker is killed on addresses containing 'die'."""
+    def send_messages(self, messages):
+        if any('die' in to for message in messages for to in message.to):
+            raise KeyboardInterrupt
+        return super().send_messages(messages)
+
+
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.coordinator = User.objects.create_user(
+            email='coordinator@example.com', username='coordinator', password='x', role='COORDINATOR')
+        make_teams(0, 3)
+
+    def set_deadline(self):
+        self.client.force_login(self.coordinator)
+        return self.client.post(reverse('coordinator_dashboard'), {
+            'action': 'set_deadline', 'slot_type': 'SRS', 'deadline_date': '2026-12-01T10:00'})
+
+    def test_set_deadline_only_queues(self):
+        self.set_deadline()
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutboundEmail.objects.filter(status='PENDING').count(), 3)
+
+        self.assertEqual(run_outbox(batch_size=2, once=True), 3)
+        # One message per team; no student sees another's address
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [f'team{i}@example.com' for i in range(3)])
+        self.assertTrue(all(len(m.to) == 1 and not m.cc and not m.bcc for m in mail.outbox))
+        self.assertEqual(OutboundEmail.objects.filter(status='SENT').count(), 3)
+
+    @override_settings(EMAIL_BACKEND='accounts.tests.BouncingBackend')
+    def test_failures_are_retried_with_backoff(self):
+        User.objects.filter(email='team1@example.com').update(email='bounce@example.com')
+        self.set_deadline()
+        self.assertEqual(run_outbox(once=True), 2)
+
+        failed = OutboundEmail.objects.get(recipient='bounce@example.com')
+        self.assertEqual((failed.status, failed.attempts), ('PENDING', 1))
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+        self.assertEqual(run_outbox(once=True), 0)  # not due yet
+
+        OutboundEmail.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now(), attempts=4)
+        run_outbox(once=True)
+        self.assertEqual(OutboundEmail.objects.get(pk=failed.pk).status, 'FAILED')
+
+    @override_settings(EMAIL_BACKEND='accounts.tests.DyingBackend')
+    def test_marked_sent_per_message(self):
+        User.objects.filter(email='team1@example.com').update(email='die@example.com')
+        self.set_deadline()
+        with self.assertRaises(KeyboardInterrupt):
+            run_outbox(once=True)
+        # A requeued batch must not send team0 again
+        self.assertEqual(dict(OutboundEmail.objects.values_list('recipient', 'status')), {
+            'team0@example.com': 'SENT', 'die@example.com': 'SENDING', 'team2@example.com': 'SENDING'})
+
+
+class SubmissionTestCase(TestCase):
+    """A team and one open slot, with MEDIA_ROOT in a temporary directory."""
+    slot_type = 'SRS'
+
+    @classmethod
+    def setUpTestData(cls):
+        team, = make_teams(0, 1)
+        cls.user = team.user
+        cls.slot = DocumentSlot.objects.create(
+            title=cls.slot_type, slot_type=cls.slot_type, deadline=timezone.now() + timedelta(days=1))
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = self.settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client.force_login(self.user)
+
+
+class UploadTests(SubmissionTestCase):
+
+    def upload(self, name, content):
+        return self.client.post(reverse('upload_document', args=[self.slot.pk]),
+                                {'doc_file': SimpleUploadedFile(name, content)})
+
+    def staged_files(self):
+        incoming = os.path.join(self.media, 'submissions', '.incoming')
+        return os.listdir(incoming) if os.path.isdir(incoming) else []
+
+    def test_streams_to_final_storage_with_hash(self):
+        content = b'%PDF-1.4\n' + os.urandom(600 * 1024)
+        self.upload('srs.pdf', content)
+        submission = TeamSubmission.objects.get()
+        self.assertEqual(submission.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual((submission.size, submission.status), (len(content), 'On Time'))
+        with submission.file.open('rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(self.staged_files(), [])
+
+    def test_rejects_wrong_type(self):
+        self.upload('srs.exe', b'MZ' + b'0' * 100)
+        self.upload('srs.pdf', b'not a pdf')
+        self.assertFalse(TeamSubmission.objects.exists())
+        self.assertEqual(self.staged_files(), [])
+
+    def test_rejects_oversized_upload(self):
+        limits = copy.deepcopy(settings.EVALX_UPLOAD_LIMITS)
+        limits['SRS'] = {'max_bytes': 1024, 'extensions': ['.pdf']}
+        with self.settings(EVALX_UPLOAD_LIMITS=limits):
+            response = self.upload('srs.pdf', b'%PDF-' + b'0' * 30 * 1024)  # cut off while streaming
+            self.upload('srs.pdf', b'%PDF-' + b'0' * 200 * 1024)  # refused from Content-Length
+        self.assertFalse(TeamSubmission.objects.exists())
+        self.assertEqual(self.staged_files(), [])
+        self.assertIn('too large', str(list(response.wsgi_request._messages)[0]))
+
+    def blob_files(self):
+        return [f for _, _, files in os.walk(os.path.join(self.media, 'submissions', 'blobs')) for f in files]
+
+    def test_identical_uploads_share_one_blob(self):
+        content = b'%PDF-1.4\n' + os.urandom(1024)
+        self.upload('proposal.pdf', content)
+        self.upload('proposal (1).pdf', content)
+        first, second = TeamSubmission.objects.order_by('pk')
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(second.original_name, 'proposal (1).pdf')
+        self.assertEqual(SubmissionBlob.objects.get().ref_count, 2)
+        self.assertEqual(len(self.blob_files()), 1)
+
+        first.delete()
+        self.slot.delete()  # cascades to the second submission
+        self.assertEqual(SubmissionBlob.objects.get().ref_count, 0)
+        self.assertEqual(collect_garbage(), (0, 0))  # still within the grace period
+        SubmissionBlob.objects.update(created_at=timezone.now() - timedelta(days=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(collect_garbage(), (1, len(content)))
+        self.assertFalse(SubmissionBlob.objects.exists())
+        self.assertEqual(self.blob_files(), [])
+
+    def test_garbage_collection_spares_a_blob_taken_back(self):
+        content = b'%PDF-1.4\n' + os.urandom(1024)
+        self.upload('proposal.pdf', content)
+        TeamSubmission.objects.get().delete()
+        SubmissionBlob.objects.update(created_at=timezone.now() - timedelta(days=1))
+
+        select = blobs._dead_blobs
+
+        def reuploaded(cutoff):
+            # An identical upload references the blob again right after the SELECT
+            dead = select(cutoff)
+            SubmissionBlob.objects.update(ref_count=F('ref_count') + 1)
+            return dead
+
+        with mock.patch('accounts.blobs._dead_blobs', reuploaded), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(collect_garbage(), (0, 0))
+        self.assertEqual(SubmissionBlob.objects.get().ref_count, 1)
+        self.assertEqual(len(self.blob_files()), 1)
+
+
+class ResumableUploadTests(SubmissionTestCase):
+    slot_type = 'REPORT'
+
+    def start(self, content, **extra):
+        response = self.client.post(reverse('upload_session_start', args=[self.slot.pk]),
+                                    {'file_name': 'report.pdf', 'size': len(content), **extra})
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def patch(self, session, offset, chunk, checksum=None):
+        checksum = checksum or hashlib.sha256(chunk).hexdigest()
+        return self.client.patch(session['url'], chunk, content_type='application/offset+octet-stream',
+                                 headers={'Upload-Offset': str(offset), 'Upload-Checksum': f'sha256 {checksum}'})
+
+    def test_resume_after_interruption(self):
+        content = b'%PDF-1.7\n' + os.urandom(300 * 1024)
+        session = self.start(content, sha256=hashlib.sha256(content).hexdigest())
+        self.assertEqual(self.patch(session, 0, content[:100000]).json()['offset'], 100000)
+
+        # A corrupted chunk is dropped, a stale offset is answered with the real one
+        self.assertEqual(self.patch(session, 100000, content[100000:200000], checksum='0' * 64).status_code, 400)
+        conflict = self.patch(session, 0, content[:100000])
+        self.assertEqual((conflict.status_code, conflict.json()['offset']), (409, 100000))
+
+        # The client reconnects, asks for the offset and finishes
+        self.assertEqual(self.start(content, sha256=hashlib.sha256(content).hexdigest())['id'], session['id'])
+        self.assertEqual(self.client.head(session['url'])['Upload-Offset'], '100000')
+        self.assertEqual(self.patch(session, 100000, content[100000:]).json()['status'], 'COMPLETE')
+
+        submission = TeamSubmission.objects.get()
+        self.assertEqual((submission.sha256, submission.original_name), (hashlib.sha256(content).hexdigest(), 'report.pdf'))
+        with submission.file.open('rb') as f:
+            self.assertEqual(f.read(), content)
+
+    def test_only_the_same_file_resumes(self):
+        content = b'%PDF-1.7\n' + os.urandom(1000)
+        first = self.start(content)
+        self.patch(first, 0, content[:500])
+        # Same name and size but no hash: a re-export must not resume the old part file
+        self.assertNotEqual(self.start(content)['id'], first['id'])
+
+    def test_chunk_is_read_before_the_row_lock(self):
+        content = b'%PDF-1.7\n' + os.urandom(1000)
+        session = UploadSession.objects.get(pk=self.start(content)['id'])
+        depth = len(connection.savepoint_ids)
+        test = self
+
+        class SlowClient(BytesIO):
+            def read(self, size=-1):
+                test.assertEqual(len(connection.savepoint_ids), depth)  # no transaction open
+                return super().read(size)
+
+        resumable.write_chunk(session.pk, session.team, 0, SlowClient(content[:500]), 500)
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).received, 500)
+
+    def test_deadline_is_judged_by_the_first_chunk(self):
+        content = b'%PDF-1.7\n' + os.urandom(1000)
+        session = self.start(content)
+        self.patch(session, 0, content[:500])
+        DocumentSlot.objects.filter(pk=self.slot.pk).update(deadline=timezone.now())  # deadline passes mid-upload
+        self.patch(session, 500, content[500:])
+        self.assertEqual(TeamSubmission.objects.get().status, 'On Time')
+
+    def test_empty_session_opened_before_the_deadline(self):
+        content = b'%PDF-1.7\n' + os.urandom(1000)
+        deadline = timezone.now() + timedelta(hours=1)
+        DocumentSlot.objects.filter(pk=self.slot.pk).update(deadline=deadline)
+        session = self.start(content)
+        self.assertEqual(UploadSession.objects.get().expires_at, deadline + DEADLINE_GRACE)
+        DocumentSlot.objects.filter(pk=self.slot.pk).update(deadline=timezone.now())
+        self.patch(session, 0, content)
+        self.assertEqual(TeamSubmission.objects.get().status, 'Late')
+
+    def test_part_file_without_local_storage(self):
+        content = b'%PDF-1.7\n' + os.urandom(1000)
+        with mock.patch.object(FileSystemStorage, 'path', side_effect=NotImplementedError):
+            session = UploadSession.objects.get(pk=self.start(content)['id'])
+            self.assertTrue(resumable.part_path(session).startswith(tempfile.gettempdir()))
+            self.assertTrue(os.path.exists(resumable.part_path(session)))
+            resumable.abandon(session.pk, session.team)
+
+
+class DownloadTests(SubmissionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = b'%PDF-1.4\n' + os.urandom(200 * 1024)
+        self.client.post(reverse('upload_document', args=[self.slot.pk]),
+                         {'doc_file': SimpleUploadedFile('srs.pdf', self.content)})
+        self.submission = TeamSubmission.objects.get()
+        self.url = reverse('submission_file', args=[self.submission.pk])
+
+    def test_full_file_range_and_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['ETag'], f'"{self.submission.sha256}"')
+        self.assertEqual(response['Content-Disposition'], 'inline; filename="srs.pdf"')
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=100-199'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+        response = self.client.get(self.url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+        self.assertEqual(self.client.get(self.url, headers={'Range': f'bytes={len(self.content)}-'}).status_code, 416)
+
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+
+    def test_only_the_team_its_guide_and_staff_can_download(self):
+        guide = User.objects.create_user(email='guide@example.com', username='guide', password='x', role='GUIDE')
+        stranger, = make_teams(1, 1, guide)
+        self.client.force_login(stranger.user)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(guide)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        Team.objects.filter(pk=self.submission.team_id).update(guide=guide)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    @override_settings(EVALX_SENDFILE='x-accel')
+    def test_hands_off_to_the_front_server(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.submission.file.name}')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(EVALX_SENDFILE='x-accel')
+    def test_front_server_path_is_quoted(self):
+        # A pre-blob upload stored under its original name
+        name = 'submissions/SRS final #2.pdf'
+        with open(os.path.join(self.media, name), 'wb') as f:
+            f.write(self.content)
+        TeamSubmission.objects.filter(pk=self.submission.pk).update(file=name, sha256='')
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/submissions/SRS%20final%20%232.pdf')
@@ -0,0 +1,167 @@
+"""
+Streaming upload pipeline for team submissions.
+
+upload_document refuses a request whose Content-Length is already over the
+slot's limit (settings.EVALX_UPLOAD_LIMITS) without reading it, then
+installs SubmissionUploadHandler as the only upload handler. The handler
+checks the limits as the body arrives: a disallowed file extension is
+rejected before any file data is read, the first chunk must start with
+the signature of the claimed type, and an upload that grows past the size
+cap is cut off at that chunk.
+
+Accepted chunks are written straight into a staging file next to their
+final location in the submissions storage, hashing (SHA-256) as they go;
+store_submission() then only renames it into the blob store (blobs.py).
+The file is never held in memory nor written twice.
+"""
+import hashlib
+import os
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from .blobs import STAGING_DIR, store_blob
+from .models import TeamSubmission
+
+UploadLimits = namedtuple('UploadLimits', 'max_bytes extensions')
+
+# Leading bytes of each accepted file type
+SIGNATURES = {
+    '.pdf': (b'%PDF-',),
+    '.docx': (b'PK\x03\x04',),
+    '.pptx': (b'PK\x03\x04',),
+    '.doc': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),
+    '.ppt': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),
+}
+
+# Room for the multipart boundaries and the other form fields
+MULTIPART_OVERHEAD = 64 * 1024
+
+FIELD_NAME = 'doc_file'
+
+
+def upload_limits(slot_type):
+    """The UploadLimits of a slot type (falling back to the 'default' entry)."""
+    limits = settings.EVALX_UPLOAD_LIMITS
+    spec = limits.get(slot_type, limits['default'])
+    return UploadLimits(int(spec['max_bytes']), tuple(e.lower() for e in spec['extensions']))
+
+
+def too_large_message(limits):
+    return f"File is too large (limit {limits.max_bytes / (1024 * 1024):g} MB)."
+
+
+def announced_too_large(request, limits):
+    """True when the request's Content-Length alone already exceeds the limit."""
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return False
+    return length > limits.max_bytes + MULTIPART_OVERHEAD
+
+
+def _storage():
+    return TeamSubmission._meta.get_field('file').storage
+
+
+def _staging_path(name):
+    """A path in the submissions storage when it is on local disk, else a temp dir."""
+    try:
+        directory = _storage().path(STAGING_DIR)
+    except NotImplementedError:
+        import tempfile
+        directory = os.path.join(tempfile.gettempdir(), 'evalx_uploads')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+class StreamedUpload(UploadedFile):
+    """A finished upload: already on disk at staged_path, with its SHA-256."""
+
+    def __init__(self, staged_path, name, content_type, size, sha256):
+        super().__init__(file=None, name=name, content_type=content_type, size=size)
+        self.staged_path = staged_path
+        self.sha256 = sha256
+
+    def open(self, mode='rb'):
+        self.file = open(self.staged_path, mode)
+        return self
+
+
+class SubmissionUploadHandler(FileUploadHandler):
+    """Streams the doc_file field to a staging file, enforcing the slot's limits."""
+    chunk_size = 256 * 1024
+
+    def __init__(self, request, slot_type):
+        super().__init__(request)
+        self.limits = upload_limits(slot_type)
+        self.error = None
+        self.staged = None
+
+    def _reject(self, message, reset=False):
+        self.error = message
+        self._discard()
+        raise StopUpload(connection_reset=reset)
+
+    def _discard(self):
+        if self.staged:
+            self.staged.close()
+            try:
+                os.remove(self.staged.name)
+            except FileNotFoundError:
+                pass
+            self.staged = None
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        if field_name != FIELD_NAME or self.staged:
+            self._reject("Unexpected file in the upload.")
+        extension = os.path.splitext(file_name)[1].lower()
+        if extension not in self.limits.extensions:
+            self._reject(f"Only {', '.join(self.limits.extensions)} files are accepted for this slot.")
+        self.extension = extension
+        self.size = 0
+        self.hash = hashlib.sha256()
+        self.staged = open(_staging_path(f'{uuid.uuid4().hex}.part'), 'wb')
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.size == 0 and raw_data and not raw_data.startswith(SIGNATURES.get(self.extension, (b'',))):
+            self._reject(f"The file is not a valid {self.extension} document.")
+        self.size += len(raw_data)
+        if self.size > self.limits.max_bytes:
+            # Stop reading the body altogether; nothing more is stored
+            self._reject(too_large_message(self.limits), reset=True)
+        self.hash.update(raw_data)
+        self.staged.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.size == 0:
+            self._reject("The uploaded file is empty.")
+        self.staged.close()
+        upload = StreamedUpload(self.staged.name, self.file_name, self.content_type, self.size, self.hash.hexdigest())
+        self.staged = None
+        return upload
+
+    def upload_interrupted(self):
+        self._discard()
+
+
+def store_submission(upload, team, slot):
+    """
+    Hands a StreamedUpload to the blob store (a rename, or nothing at all
+    for content already stored) and records the TeamSubmission (status
+    from TeamSubmission.save).
+    """
+    extension = os.path.splitext(upload.name)[1]
+    with transaction.atomic():
+        blob = store_blob(upload.staged_path, upload.sha256, upload.size, extension)
+        submission = TeamSubmission(team=team, slot=slot, blob=blob, original_name=upload.name,
+                                    sha256=upload.sha256, size=upload.size)
+        submission.file.name = blob.file.name
+        submission.save()
+    return submission
@@ -11,6 +11,9 @@ urlpatterns = [
     path('login/team/', views.team_login, name='team_login'),
     path('dashboard/team/', views.team_dashboard, name='team_dashboard'),
     path('upload/<int:slot_id>/', views.upload_document, name='upload_document'),
+    path('upload/<int:slot_id>/sessions/', views.upload_session_start, name='upload_session_start'),
+    path('upload/sessions/<uuid:session_id>/', views.upload_session, name='upload_session'),
+    path('submissions/<int:submission_id>/file/', views.submission_file, name='submission_file'),
     path('logout/', auth_views.LogoutView.as_view(next_page='portal_gatekeeper'), name='logout'),
     path('coordinator/dashboard/', views.coordinator_dashboard, name='coordinator_dashboard'),
     path('hod/dashboard/', views.hod_dashboard, name='hod_dashboard'),
@@ -31,4 +34,11 @@ urlpatterns = [
     path('reports/report-marks/', views.report_report_marks_consolidated, name='report_report_cons'),
     path('reports/final-internal/', views.report_final_internal, name='report_final_internal'),
     path('reports/master-sheet-pdf/', views.report_team_master_pdf, name='report_master_sheet_pdf'),
+
+    # --- MODERATION ANALYTICS (?format=json for the raw numbers) ---
+    path('reports/analytics/', views.cohort_analytics_view, name='cohort_analytics'),
+
+    # --- BACKGROUND REPORT JOBS (?async=1 on any report) ---
+    path('reports/jobs/<uuid:job_id>/', views.report_job_status, name='report_job_status'),
+    path('reports/jobs/<uuid:job_id>/download/', views.report_job_download, name='report_job_download'),
 ]
\ No newline at end of file
@@ -1,27 +1,31 @@
-import os
-import random, string
 from django.shortcuts import render, redirect, get_object_or_404
-from django.utils import timezone
-import openpyxl
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.mail import send_mail
 from django.conf import settings
-from django.http import HttpResponse
-from .models import User, Team, TeamMember, DocumentSlot, TeamSubmission
-from django.db.models import Count
-from django.template.loader import render_to_string
-from xhtml2pdf import pisa
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from .models import User, Team, TeamMember, DocumentSlot, TeamSubmission, ReportJob, UploadSession
+from .exports import EXPORT_FORMATS, export_report
+from .reports import REPORTS, TEAM_MASTER_COLUMNS, render_report_pdf
+from .report_jobs import enqueue_report
+from .report_cache import cached_report
+from .dashboards import coordinator_dashboard_data, guide_dashboard_data, hod_dashboard_data, member_prefetch
+from .rubric import get_rubric
+from .allocation import AllocationError, allocate_guide, next_team_id
+from .analytics import cohort_analytics, np
+from .outbox import queue_email
+from .downloads import can_view, serve_submission
+from .resumable import UploadError, abandon, session_state, start_session, write_chunk
+from .uploads import SubmissionUploadHandler, announced_too_large, store_submission, too_large_message, upload_limits
+from .batch_sheets import BATCH_SHEETS, batch_page, next_cursor, save_batch_sheet
+from django.db import transaction
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 
 def portal_gatekeeper(request):
     """The 4-panel landing page."""
     return render(request, 'accounts/portal_gatekeeper.html')
 
-# accounts/views.py
-from django.db.models import Count
-import random, string
-
 def register_team(request):
     if request.method == 'POST':
         email = request.POST.get('email')
@@ -33,48 +37,38 @@ def register_team(request):
             return render(request, 'accounts/register.html')
 
         try:
-            # 1. Create User
-            user = User.objects.create_user(email=email, username=email, password=password, role='TEAM')
-            
-            # 2. Allocate Guide (Load Balancing Logic)
-            # We count 'team_profile' (your related_name) and order by the lowest count
-            guides = User.objects.filter(role='GUIDE').annotate(
-                t_count=Count('team_profile')
-            ).order_by('t_count','id')
-            
-            # Select the guide with the absolute least number of teams
-            assigned_guide = guides.first()
-            
-            if not assigned_guide:
-                # Fallback if no guides are in the database yet
-                user.delete() # Rollback user creation if no guide can be assigned
-                messages.error(request, "Registration failed: No Faculty Guides are currently available.")
-                return render(request, 'accounts/register.html')
-
-            # 3. Create Team
-            t_id = 'TM' + ''.join(random.choices(string.digits, k=5))
-            team = Team.objects.create(
-                team_id=t_id,
-                user=user,
-                guide=assigned_guide, # The guide with the least teams is now assigned
-                leader_name=l_name
-            )
+            # User, guide slot, team and members commit together or not at all
+            with transaction.atomic():
+                # 1. Create User
+                user = User.objects.create_user(email=email, username=email, password=password, role='TEAM')
+
+                # 2. Allocate Guide (least-loaded guide under capacity, row-locked)
+                assigned_guide = allocate_guide()
+
+                # 3. Create Team (next number of this academic year's sequence)
+                t_id = next_team_id()
+                team = Team.objects.create(
+                    team_id=t_id,
+                    user=user,
+                    guide=assigned_guide, # The guide with the least teams is now assigned
+                    leader_name=l_name
+                )
 
-            # 4. Save Members
-            for i in range(1, 5):
-                name = request.POST.get(f'm{i}_name')
-                reg = request.POST.get(f'm{i}_reg')
-                if name and reg:
-                    TeamMember.objects.create(
-                        team=team,
-                        name=name,
-                        reg_number=reg,
-                        is_leader=(name == l_name)
+                # 4. Save Members
+                TeamMember.objects.bulk_create([
+                    TeamMember(team=team, name=name, reg_number=reg, is_leader=(name == l_name))
+                    for name, reg in (
+                        (request.POST.get(f'm{i}_name'), request.POST.get(f'm{i}_reg')) for i in range(1, 5)
                     )
+                    if name and reg
+                ])
 
             messages.success(request, f"Successfully Registered! Team ID: {t_id}")
             return redirect('team_login')
 
+        except AllocationError as e:
+            messages.error(request, f"Registration failed: {e}")
+            return render(request, 'accounts/register.html')
         except Exception as e:
             messages.error(request, f"Error: {str(e)}")
             return render(request, 'accounts/register.html')
@@ -139,7 +133,7 @@ def team_dashboard(request):
         return redirect('team_login')
 
     # Accessing members from the specific team instance
-    members = team.members.all()
+    members = team.members.identity()
     
     # Coordinator-controlled: Only show slots they have activated
     active_slots = DocumentSlot.objects.filter(is_active=True).order_by('deadline')
@@ -155,53 +149,113 @@ def team_dashboard(request):
         'active_slots': active_slots,
         'submissions': submissions,
         'submitted_slots': submitted_slots, # Required for 'Submitted' status labels
+        'resumable_slots': settings.EVALX_RESUMABLE_SLOTS,
     }
     return render(request, 'accounts/team_dashboard.html', context)
 
+@csrf_exempt  # checked by _receive_upload, once the streaming handler is installed
+@login_required
 def upload_document(request, slot_id):
-    if request.method == 'POST' and request.FILES.get('doc_file'):
-        slot = DocumentSlot.objects.get(id=slot_id)
+    if request.user.role != 'TEAM':
+        return redirect('team_login')
+    slot = get_object_or_404(DocumentSlot, id=slot_id)
+    if request.method == 'POST':
+        limits = upload_limits(slot.slot_type)
+        if announced_too_large(request, limits):
+            messages.error(request, too_large_message(limits))
+            return redirect('team_dashboard')
+        # Stream the file to disk under the slot's limits (no in-memory copy)
+        request.upload_handlers = [SubmissionUploadHandler(request, slot.slot_type)]
+        return _receive_upload(request, slot)
+    return redirect('team_dashboard')
+
+@csrf_protect
+def _receive_upload(request, slot):
+    handler = request.upload_handlers[0]
+    upload = request.FILES.get('doc_file')
+    if handler.error:
+        messages.error(request, handler.error)
+    elif upload:
         # Status is handled automatically by the save() method in models.py
-        TeamSubmission.objects.create(
-            team=request.user.student_profile,
-            slot=slot,
-            file=request.FILES['doc_file']
-        )
+        store_submission(upload, request.user.student_profile, slot)
         messages.success(request, f"File for {slot.title} uploaded successfully.")
     return redirect('team_dashboard')
 
+# --- RESUMABLE UPLOADS (see resumable.py for the protocol) ---
+
+def _upload_error(e, session=None):
+    body = {'error': str(e)}
+    if session is not None:
+        body['offset'] = session.received
+    return JsonResponse(body, status=e.status)
+
+@login_required
+def upload_session_start(request, slot_id):
+    if request.user.role != 'TEAM' or request.method != 'POST':
+        return JsonResponse({'error': "Not allowed."}, status=403 if request.method == 'POST' else 405)
+    slot = get_object_or_404(DocumentSlot, id=slot_id, is_active=True)
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': "size is required."}, status=400)
+    try:
+        session = start_session(request.user.student_profile, slot, request.POST.get('file_name', ''), size,
+                                request.POST.get('sha256', ''))
+    except UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(session_state(request, session), status=201)
+
+@login_required
+def upload_session(request, session_id):
+    if request.user.role != 'TEAM':
+        return JsonResponse({'error': "Not allowed."}, status=403)
+    team = request.user.student_profile
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return JsonResponse({'error': "Upload-Offset and Content-Length are required."}, status=400)
+        algorithm, _, checksum = request.headers.get('Upload-Checksum', '').partition(' ')
+        if algorithm and algorithm.lower() != 'sha256':
+            return JsonResponse({'error': "Only sha256 chunk checksums are supported."}, status=400)
+        try:
+            # Read straight from the request stream (never request.body)
+            session = write_chunk(session_id, team, offset, request, length, checksum)
+        except UploadError as e:
+            return _upload_error(e, UploadSession.objects.filter(pk=session_id, team=team).first())
+    elif request.method == 'DELETE':
+        try:
+            abandon(session_id, team)
+        except UploadError as e:
+            return _upload_error(e)
+        return HttpResponse(status=204)
+    elif request.method in ('GET', 'HEAD'):
+        session = get_object_or_404(UploadSession, pk=session_id, team=team)
+    else:
+        return JsonResponse({'error': "Method not allowed."}, status=405)
+    response = JsonResponse(session_state(request, session))
+    response['Upload-Offset'] = str(session.received)
+    return response
+
+@login_required
+def submission_file(request, submission_id):
+    """A submitted document, for the team, its guide, the HOD and coordinators only."""
+    submission = get_object_or_404(TeamSubmission.objects.select_related('team'), pk=submission_id)
+    if not can_view(request.user, submission):
+        raise Http404
+    return serve_submission(request, submission)
+
 @login_required
 def coordinator_dashboard(request):
     if request.user.role != 'COORDINATOR':
         return redirect('coordinator_login')
 
-    teams = Team.objects.all().prefetch_related('members').order_by('-created_at')
-    
-    # 1. Fetch slots and create a map for easy lookup
-    slots = DocumentSlot.objects.all()
-    slots_dict = {slot.slot_type: slot for slot in DocumentSlot.objects.all()}
-
-    # 2. FEATURE: Map submissions by team with file URLs for viewing
-    from collections import defaultdict
-    submissions_raw = TeamSubmission.objects.all().select_related('slot')
-    team_submissions_map = defaultdict(dict)
-    for sub in submissions_raw:
-        # Store the URL so the badge becomes a clickable link
-        team_submissions_map[sub.team_id][sub.slot.slot_type] = sub.file.url 
-
-    # --- MAINTAINED: EXCEL EXPORT ---
+    teams = Team.objects.order_by('-created_at')
+
+    # --- MAINTAINED: EXCEL EXPORT (streamed) ---
     if 'export_excel' in request.GET:
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename=Team_Master_Sheet.xlsx'
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Team Details"
-        ws.append(['Team ID', 'Project Title', 'Guide', 'Members (Reg No)'])
-        for team in teams:
-            member_list = ", ".join([f"{m.name} ({m.reg_number})" for m in team.members.all()])
-            ws.append([team.team_id, team.project_title or "Not Set", str(team.guide), member_list])
-        wb.save(response)
-        return response
+        return export_report('excel', teams.select_related('guide').prefetch_related(member_prefetch()), TEAM_MASTER_COLUMNS, "Team_Master_Sheet", "Team Details")
 
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -241,19 +295,16 @@ def coordinator_dashboard(request):
                 )
                 notification_msg = "Deadline sent and teams notified."
 
-            # Broadcast Notification
+            # Broadcast Notification: one queued message per team, sent by
+            # the send_outbox worker (this request never waits on SMTP)
             student_emails = User.objects.filter(role='TEAM').values_list('email', flat=True)
-            try:
-                send_mail(
-                    subject=f"EvalX Update: {slot_type}",
-                    message=f"Hello Teams,\n\n{notification_msg}\n\nPlease check your dashboard.",
-                    from_email=settings.EMAIL_HOST_USER,
-                    recipient_list=list(student_emails),
-                    fail_silently=False,
-                )
-                messages.success(request, notification_msg)
-            except Exception:
-                messages.warning(request, f"{notification_msg} (Email notifications failed).")
+            queue_email(
+                subject=f"EvalX Update: {slot_type}",
+                body=f"Hello Teams,\n\n{notification_msg}\n\nPlease check your dashboard.",
+                recipients=student_emails,
+                from_email=settings.EMAIL_HOST_USER,
+            )
+            messages.success(request, notification_msg)
 
             return redirect('coordinator_dashboard')
         
@@ -271,169 +322,176 @@ def coordinator_dashboard(request):
             
             return redirect('coordinator_dashboard')
 
+    # One keyset page of teams (see dashboards.team_page for the filters);
+    # teams, members, slots and latest submissions are a fixed handful of queries
+    context = coordinator_dashboard_data(teams, request.GET)
+    params = request.GET.copy()
+    params.pop('after', None)
+    context['filter_query'] = params.urlencode()
+    return render(request, 'accounts/coordinator_dashboard.html', context)
+
+def _batch_sheet(request, sheet_key):
+    """
+    Renders one keyset page of a coordinator batch sheet (?after=, ?team=,
+    ?guide=), or saves the posted page in one bulk transaction.
+    ?format=json returns the page as rows for a lazily loading grid.
+    """
+    if request.user.role != 'COORDINATOR':
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'error': "Not allowed."}, status=403)
+        return redirect('coordinator_login')
+
+    sheet = BATCH_SHEETS[sheet_key]
+    members = TeamMember.objects.all()
+    if request.method == 'POST':
+        try:
+            changed = save_batch_sheet(request.POST, members, sheet)
+        except ValueError:
+            messages.error(request, f"{sheet.title}: every mark must be a number between 0 and its maximum. Nothing was saved.")
+            return redirect(request.get_full_path())
+        messages.success(request, f"{sheet.title} saved: {changed} student(s) updated.")
+        return redirect(request.get_full_path())
+
+    # Saving above needs full rows (every mark feeds the persisted totals);
+    # rendering only needs the sheet's own columns
+    page, filters, size = batch_page(members.projection(sheet.projection), request.GET)
+    if request.GET.get('format') == 'json':
+        rows = list(page.values('id', 'reg_number', 'name', 'team_id', *sheet.fields))
+        return JsonResponse({'rows': rows, 'next': next_cursor(rows, size)})
+
+    page = list(page)
+    params = request.GET.copy()
+    params.pop('after', None)
     context = {
-        'teams': teams,
-        'slots_dict': slots_dict,
-        'team_submissions_map': dict(team_submissions_map),
-        'now': timezone.now(), # Required for overdue (RED) check
-        'members': TeamMember.objects.all().order_by('reg_number'),
+        'members': page,
+        'next_cursor': next_cursor(page, size),
+        'filter_query': params.urlencode(),
+        'filters': filters,
+        'guides': User.objects.filter(role='GUIDE').order_by('email'),
+        'maxima': get_rubric().maxima,
     }
-    return render(request, 'accounts/coordinator_dashboard.html', context)
+    return render(request, sheet.template, context)
 
 @login_required
 def evaluate_r1_batch_coordinator(request):
-    members = TeamMember.objects.all().order_by('reg_number')
-    if request.method == 'POST':
-        for m in members:
-            m.r1_c_comp = float(request.POST.get(f'comp_{m.id}', 0))
-            m.r1_c_func = float(request.POST.get(f'func_{m.id}', 0))
-            m.r1_c_pres = float(request.POST.get(f'pres_{m.id}', 0))
-            m.r1_c_oral = float(request.POST.get(f'oral_{m.id}', 0))
-            m.r1_c_know = float(request.POST.get(f'know_{m.id}', 0))
-            m.r1_c_absent = f'absent_{m.id}' in request.POST
-            m.save()
-        return redirect('coordinator_dashboard')
-    return render(request, 'accounts/batch_sheet_r1.html', {'members': members})
+    return _batch_sheet(request, 'r1')
 
 @login_required
 def evaluate_r2_batch_coordinator(request):
-    members = TeamMember.objects.all().order_by('reg_number')
-    if request.method == 'POST':
-        for m in members:
-            m.r2_c_comp = float(request.POST.get(f'comp_{m.id}', 0))
-            m.r2_c_func = float(request.POST.get(f'func_{m.id}', 0))
-            m.r2_c_pres = float(request.POST.get(f'pres_{m.id}', 0))
-            m.r2_c_oral = float(request.POST.get(f'oral_{m.id}', 0))
-            m.r2_c_know = float(request.POST.get(f'know_{m.id}', 0))
-            m.r2_c_absent = f'absent_{m.id}' in request.POST
-            m.save()
-        return redirect('coordinator_dashboard')
-    return render(request, 'accounts/batch_sheet_r2.html', {'members': members})
+    return _batch_sheet(request, 'r2')
 
 @login_required
 def evaluate_s2_batch_coordinator(request):
-    members = TeamMember.objects.all().order_by('reg_number')
-    if request.method == 'POST':
-        for m in members:
-            m.s2_teamwork = float(request.POST.get(f'teamwork_{m.id}', 0))
-            m.s2_tech_know = float(request.POST.get(f'tech_{m.id}', 0))
-            m.s2_regularity = float(request.POST.get(f'reg_{m.id}', 0))
-            m.save()
-        messages.success(request, "Institutional Sheet 2 updated.")
-        return redirect('coordinator_dashboard')
-    return render(request, 'accounts/batch_sheet_s2.html', {'members': members})
+    return _batch_sheet(request, 's2')
 
 @login_required
 def evaluate_report_batch_coordinator(request):
-    members = TeamMember.objects.all().order_by('reg_number')
-    if request.method == 'POST':
-        for m in members:
-            m.report_coord = float(request.POST.get(f'report_{m.id}', 0))
-            m.save()
-        return redirect('coordinator_dashboard')
-    return render(request, 'accounts/batch_sheet_report.html', {'members': members})
+    return _batch_sheet(request, 'report')
 
 @login_required
 def evaluate_attendance_batch_coordinator(request):
-    members = TeamMember.objects.all().order_by('reg_number')
-    if request.method == 'POST':
-        for m in members:
-            m.attendance_marks = float(request.POST.get(f'attendance_{m.id}', 0))
-            m.save()
-        return redirect('coordinator_dashboard')
-    return render(request, 'accounts/batch_sheet_attendance.html', {'members': members})
-
-# --- REUSABLE EXCEL HELPER ---
-
-def export_to_excel(queryset, filename, sheet_name, headers, row_callback):
-    """Generates an Excel response using openpyxl."""
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename={filename}.xlsx'
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = sheet_name
-    
-    # Add Bold Headers
-    ws.append(headers)
-    for cell in ws[1]:
-        cell.font = openpyxl.styles.Font(bold=True)
-    
-    for obj in queryset:
-        ws.append(row_callback(obj))
-        
-    wb.save(response)
-    return response
+    return _batch_sheet(request, 'attendance')
 
 # --- CONSOLIDATED PDF & EXCEL REPORTS ---
 
-def generate_branded_pdf(template_src, context_dict, filename):
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'assets', 'branding', 'logo.png')
-    context_dict['logo_path'] = logo_path
-    html = render_to_string(template_src, context_dict)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}.pdf"'
-    pisa.CreatePDF(html, dest=response)
-    return response
+def _serve_report(request, key):
+    """
+    Serves a consolidated report as PDF, or as a data export with ?format=.
+    ?async=1 queues the PDF for the background worker instead.
+    """
+    spec = REPORTS[key]
+    params = request.GET.dict()
+    if params.get('async'):
+        job = enqueue_report(key, params, request.user)
+        return JsonResponse(_job_status(request, job), status=202)
+
+    def build():
+        fmt = params.get('format')
+        if fmt in EXPORT_FORMATS:
+            # Streamed straight from a chunked queryset iterator, never the
+            # whole cohort in memory
+            return export_report(fmt, spec.queryset(params), spec.columns, spec.filename, spec.sheet_name)
+        response = HttpResponse(render_report_pdf(key, params), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{spec.filename}.pdf"'
+        return response
+
+    # Unchanged marks -> the same cache key, served as a plain file read
+    return cached_report(request, key, params, build)
 
 @login_required
 def report_r1_consolidated(request):
-    members = TeamMember.objects.all().order_by('reg_number')
-    if request.GET.get('format') == 'excel':
-        return export_to_excel(members, "R1_Consolidated", "Review 1", 
-                              ['Reg No', 'Name', 'Guide', 'HOD', 'Coord', 'Total (40)'],
-                              lambda m: [m.reg_number, m.name, m.r1_guide_total, m.r1_hod_total, m.r1_coord_total, m.r1_consolidated_40])
-    return generate_branded_pdf('accounts/pdf_r1_cons.html', {'members': members, 'title': 'REVIEW 1 CONSOLIDATED'}, 'R1_Consolidated')
+    return _serve_report(request, 'r1_consolidated')
 
 @login_required
 def report_r2_consolidated(request):
-    members = TeamMember.objects.all().order_by('reg_number')
-    if request.GET.get('format') == 'excel':
-        return export_to_excel(members, "R2_Consolidated", "Review 2", 
-                              ['Reg No', 'Name', 'Guide', 'HOD', 'Coord', 'Total (40)'],
-                              lambda m: [m.reg_number, m.name, m.r2_guide_total, m.r2_hod_total, m.r2_coord_total, m.r2_consolidated_40])
-    return generate_branded_pdf('accounts/pdf_r2_cons.html', {'members': members, 'title': 'REVIEW 2 CONSOLIDATED'}, 'R2_Consolidated')
+    return _serve_report(request, 'r2_consolidated')
 
 @login_required
 def report_avg_evaluation_consolidated(request):
-    members = TeamMember.objects.all().order_by('reg_number')
-    if request.GET.get('format') == 'excel':
-        return export_to_excel(members, "Avg_Evaluation", "Average Eval", 
-                              ['Reg No', 'Name', 'R1 Cons', 'R2 Cons', 'Avg (40)'],
-                              lambda m: [m.reg_number, m.name, m.r1_consolidated_40, m.r2_consolidated_40, m.avg_evaluation_40])
-    return generate_branded_pdf('accounts/pdf_avg_eval_cons.html', {'members': members, 'title': 'AVERAGE EVALUATION (40)'}, 'Avg_Evaluation')
+    return _serve_report(request, 'avg_evaluation')
 
 @login_required
 def report_report_marks_consolidated(request):
-    members = TeamMember.objects.all().order_by('reg_number')
-    if request.GET.get('format') == 'excel':
-        return export_to_excel(members, "Report_Marks", "Report Marks", 
-                              ['Reg No', 'Name', 'Guide', 'HOD', 'Coord', 'Consolidated (10)'],
-                              lambda m: [m.reg_number, m.name, m.report_guide, m.report_hod, m.report_coord, m.consolidated_report_marks])
-    return generate_branded_pdf('accounts/pdf_report_cons.html', {'members': members, 'title': 'REPORT MARKS CONSOLIDATED'}, 'Report_Marks')
+    return _serve_report(request, 'report_marks')
 
 @login_required
 def report_final_internal(request):
-    members = TeamMember.objects.all().order_by('reg_number')
-    if request.GET.get('format') == 'excel':
-        return export_to_excel(members, "Final_Internal_75", "Final Internal", 
-                              ['Reg No', 'Name', 'Avg Eval', 'Sheet 2', 'Report', 'Attend', 'Final (75)'],
-                              lambda m: [m.reg_number, m.name, m.avg_evaluation_40, m.s2_total, m.consolidated_report_marks, m.attendance_marks, m.final_internal_75])
-    return generate_branded_pdf('accounts/pdf_final_internal.html', {'members': members, 'title': 'FINAL INTERNAL MARKS (75)'}, 'Final_Internal_75')
+    return _serve_report(request, 'final_internal')
 
 @login_required
 def report_team_master_pdf(request):
     if request.user.role != 'COORDINATOR':
         return redirect('coordinator_login')
-    teams = Team.objects.all().prefetch_related('members').select_related('guide').order_by('team_id')
-    
-    if request.GET.get('format') == 'excel':
-        # Custom logic for Team Master because it uses 'teams' instead of 'members'
-        return export_to_excel(teams, "Team_Master_Record", "Teams", 
-                              ['Team ID', 'Project Title', 'Guide', 'Members Details'],
-                              lambda t: [t.team_id, t.project_title or "Not Set", str(t.guide), ", ".join([f"{m.name} ({m.reg_number})" for m in t.members.all()])])
-        
-    return generate_branded_pdf('accounts/pdf_master_sheet.html', {'teams': teams, 'title': 'OFFICIAL TEAM MASTER RECORD'}, 'Team_Master_Sheet')
+    return _serve_report(request, 'team_master')
+
+# --- MODERATION ANALYTICS ---
+
+@login_required
+def cohort_analytics_view(request):
+    """Mark distributions and evaluator disagreement; ?format=json for the raw numbers."""
+    if request.user.role not in ('COORDINATOR', 'HOD'):
+        return redirect('coordinator_login')
+    if np is None:
+        return HttpResponse("Cohort analytics need the optional 'numpy' package.", status=501, content_type='text/plain')
+    params = {'format': 'json'} if request.GET.get('format') == 'json' else {}
+
+    def build():
+        data = cohort_analytics()
+        if params:
+            return JsonResponse(data)
+        return render(request, 'accounts/cohort_analytics.html', {'data': data})
+
+    # Recomputed only when marks, teams or the rubric change
+    return cached_report(request, 'cohort_analytics', params, build)
+
+# --- BACKGROUND REPORT JOBS ---
+
+def _job_status(request, job):
+    return {
+        'id': str(job.pk),
+        'report': job.report,
+        'status': job.status,
+        'status_url': request.build_absolute_uri(reverse('report_job_status', args=[job.pk])),
+        'download_url': request.build_absolute_uri(reverse('report_job_download', args=[job.pk])) if job.status == 'DONE' else None,
+        'error': job.error or None,
+    }
+
+def _get_visible_job(request, job_id):
+    job = get_object_or_404(ReportJob, pk=job_id)
+    if request.user.role not in ('COORDINATOR', 'HOD') and job.requested_by_id != request.user.pk:
+        raise Http404
+    return job
+
+@login_required
+def report_job_status(request, job_id):
+    return JsonResponse(_job_status(request, _get_visible_job(request, job_id)))
+
+@login_required
+def report_job_download(request, job_id):
+    job = _get_visible_job(request, job_id)
+    if job.status != 'DONE' or not job.file:
+        raise Http404
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=f"{REPORTS[job.report].filename}.pdf")
 
 def logout_view(request):
     """Clears the session and redirects to the landing page."""
@@ -446,16 +504,12 @@ def hod_dashboard(request):
     if request.user.role != 'HOD':
         return redirect('hod_login')
     
-    # Fetch all registered teams with their members
-    teams = Team.objects.all().prefetch_related('members').order_by('team_id')
-    
-    return render(request, 'accounts/hod_dashboard.html', {'teams': teams})
+    # Teams (with guide) and their members: two queries however many teams
+    return render(request, 'accounts/hod_dashboard.html', hod_dashboard_data())
 
 
 @login_required
 def guide_dashboard(request):
     if request.user.role != 'GUIDE':
         return redirect('guide_login')
-    assigned_teams = Team.objects.filter(guide=request.user).prefetch_related('members')
-    
-    return render(request, 'accounts/guide_dashboard.html', {'teams': assigned_teams})
\ No newline at end of file
+    return render(request, 'accounts/guide_dashboard.html', guide_dashboard_data(request.user))
\ No newline at end of file
@@ -80,6 +80,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock when a transaction starts: select_for_update()
+        # is a no-op on SQLite, and a read-then-write transaction would
+        # otherwise fail with "database is locked" under concurrent saves
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
     }
 }
 
@@ -137,4 +141,81 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER") 
 # This is NOT your login password; it is a 16-character App Password
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
-DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
\ No newline at end of file
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+# Batch evaluation sheets post up to 6 inputs per student; Django's default
+# cap of 1000 fields would reject any sheet with more than ~160 students.
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 20000
+
+# Rendered report cache (see accounts/report_cache.py). Kept outside
+# MEDIA_ROOT so cached mark sheets are never publicly served.
+REPORT_CACHE_ENABLED = True
+REPORT_CACHE_DIR = os.path.join(BASE_DIR, 'var', 'report_cache')
+REPORT_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# PDF reports are rendered in slices of this many rows; the report worker
+# (manage.py run_report_worker) renders the slices of queued reports in
+# parallel with this many processes by default
+PDF_CHUNK_SIZE = 100
+REPORT_WORKER_PROCESSES = min(4, max(1, (os.cpu_count() or 2) // 2))
+# Finished reports are stored here, outside MEDIA_ROOT like the cache, and
+# only served through the job's permission check; the worker deletes
+# jobs (and their files) this many days after they finished
+REPORT_JOB_DIR = os.path.join(BASE_DIR, 'var', 'report_jobs')
+REPORT_JOB_KEEP_DAYS = 7
+
+# Marking scheme (compiled by accounts/rubric.py). Maxima cap the mark
+# inputs; evaluator/review/final weights drive every calculated mark.
+# absent: 'zero' scores an absent evaluator as 0 in the average,
+# 'exclude' averages over the evaluators the student attended.
+# After changing it, run `manage.py recompute_scores`.
+EVALX_RUBRIC = {
+    'reviews': {
+        'r1': {
+            'criteria': {'comp': 10, 'func': 5, 'pres': 5, 'oral': 10, 'know': 10},
+            'evaluators': {'c': 1, 'h': 1, 'g': 1},
+            'absent': 'zero',
+        },
+        'r2': {
+            'criteria': {'comp': 10, 'func': 5, 'pres': 5, 'oral': 10, 'know': 10},
+            'evaluators': {'c': 1, 'h': 1, 'g': 1},
+            'absent': 'zero',
+        },
+    },
+    'review_weights': {'r1': 1, 'r2': 1},
+    'sheet2': {'s2_teamwork': 4, 's2_tech_know': 6, 's2_regularity': 5},
+    'report': {'report_guide': 10, 'report_coord': 10, 'report_hod': 10},
+    'attendance': {'attendance_marks': 10},
+    'final': {'sheet2': 1, 'report': 1, 'evaluation': 1, 'attendance': 1},
+}
+
+# Most teams a guide is allocated at registration (None = no limit). A
+# guide's GuideLoad.capacity, when set, overrides it.
+EVALX_GUIDE_CAPACITY = None
+
+# Team IDs are <prefix><number>, numbered from 1 in each academic year:
+# TM26 00001 is the first team of the year starting in June 2026. The
+# prefix is formatted with the academic year's last two digits and the
+# whole ID must fit in 10 characters.
+EVALX_TEAM_ID_PREFIX = 'TM{year:02d}'
+EVALX_TEAM_ID_DIGITS = 5
+EVALX_ACADEMIC_YEAR_START_MONTH = 6
+
+# Per-slot upload limits, checked while the upload streams in (see
+# accounts/uploads.py). Slot types not listed use 'default'.
+EVALX_UPLOAD_LIMITS = {
+    'default': {'max_bytes': 10 * 1024 * 1024, 'extensions': ['.pdf', '.doc', '.docx']},
+    'PPT1': {'max_bytes': 50 * 1024 * 1024, 'extensions': ['.pdf', '.ppt', '.pptx']},
+    'PPT2': {'max_bytes': 50 * 1024 * 1024, 'extensions': ['.pdf', '.ppt', '.pptx']},
+    'REPORT': {'max_bytes': 50 * 1024 * 1024, 'extensions': ['.pdf', '.doc', '.docx']},
+}
+
+# Slots whose upload form sends large files in resumable chunks (see
+# accounts/resumable.py); any slot accepts the protocol.
+EVALX_RESUMABLE_SLOTS = ('REPORT', 'PPT1', 'PPT2')
+
+# How submission downloads are handed to the front server (see
+# accounts/downloads.py): None (Django streams them), 'x-sendfile'
+# (Apache/lighttpd) or 'x-accel' (nginx; an internal location at
+# EVALX_SENDFILE_PREFIX aliased to MEDIA_ROOT).
+EVALX_SENDFILE = os.environ.get('EVALX_SENDFILE') or None
+EVALX_SENDFILE_PREFIX = '/protected-media/'